@@ -0,0 +1,306 @@
+#!/usr/bin/python3 -u
+
+# Benchmarks for the lookup path of oed.py. Entries are taken from oed.t in
+# the dictionary directory; without it, synthetic entries are used. With
+# --stages every stage from loading hw.t to exporting oed.t is timed, on the
+# real files or on those written by fixture.py, and with --startup the start
+# of oed.py in fresh interpreters.
+
+import argparse
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import timeit
+from itertools import islice
+
+# Entity replacement as done before decode_entities
+def decode_entities_per_entity(text):
+    for entity in oeda.entities:
+        text = text.replace(entity[0], entity[1])
+    return text
+
+# Return the largest entries in the first num_blocks blocks of oed.t
+def largest_entries(oed_path, count, num_blocks):
+    entries = []
+    with oedlib.BlockReader(oed_path) as reader:
+        for blk_index in islice(range(len(oeda.oedlen) - 1), num_blocks):
+            blk = oedlib.Dictionary.decompress_block(
+                reader, oeda.oedlen, blk_index, True)
+            entries.extend(blk.split(b'#')[1:])
+            entries = sorted(entries, key=len)[-count:]
+    return [oedlib.decode_text(e) for e in reversed(entries)]
+
+# Build entries of roughly the given size with a realistic entity density
+def synthetic_entries(count, size):
+    rng = random.Random(0)
+    names = [entity[0] for entity in oeda.entities]
+    words = ['the', 'of', 'and', 'a', 'to', '<i>in</i>', 'sense', '<b>1.</b>',
+        '<xr>see</xr>', '<d>n.</d>', '<br>']
+    entries = []
+    for _ in range(count):
+        parts = []
+        length = 0
+        while length < size:
+            part = rng.choice(names if rng.random() < 0.1 else words)
+            parts.append(part)
+            length += len(part) + 1
+        entries.append(' '.join(parts))
+    return entries
+
+def bench(func, text, repeat):
+    return min(timeit.repeat(lambda: func(text), number=1, repeat=repeat))
+
+def bench_entities(entries, repeat):
+    print('Entity decoding')
+    print(f'{"size":>10} {"per-entity":>12} {"single-pass":>12} {"speedup":>8}')
+    for text in entries:
+        before = bench(decode_entities_per_entity, text, repeat)
+        after = bench(oedlib.decode_entities, text, repeat)
+        print(f'{len(text):>10} {before * 1000:>10.2f}ms '
+            f'{after * 1000:>10.2f}ms {before / after:>7.1f}x')
+    print()
+
+# Rendering as done before render_markup
+def render_html_parser(text):
+    MyHTMLParser, _ = oedlib.html_parsers()
+    parser = MyHTMLParser()
+    parser.feed(text)
+    parser.close()
+    return parser.text
+
+def bench_render(entries, repeat):
+    print('Rendering')
+    print(f'{"size":>10} {"HTMLParser":>12} {"render":>12} {"speedup":>8}')
+    for text in entries:
+        text = oedlib.decode_entities(text)
+        assert render_html_parser(text) == oedlib.render_markup(text)
+        before = bench(render_html_parser, text, repeat)
+        after = bench(oedlib.render_markup, text, repeat)
+        print(f'{len(text):>10} {before * 1000:>10.2f}ms '
+            f'{after * 1000:>10.2f}ms {before / after:>7.1f}x')
+    print()
+
+# Folding as done before display_width
+def fold_per_char(text, width):
+    output = ''
+    text = text.replace('\u00A0', ' ')
+    text = re.sub(r' {3,}', r'  ', text)
+    for line in text.split('\n'):
+        column = 0
+        for word in line.split(' '):
+            vlen = len(word)
+            blen = vlen
+            i = 0
+            while i < blen:
+                if word[i] == '\x1b':
+                    while i < blen and word[i] != 'm':
+                        vlen -= 1
+                        i += 1
+                    vlen -= 1
+                i += 1
+            column += vlen + 1
+            if column > width:
+                column = vlen + 1
+                output += '\n'
+            output += word + ' '
+        output += '\n'
+    return output
+
+def bench_fold(entries, repeat, width=80):
+    print('Folding')
+    print(f'{"size":>10} {"per-char":>12} {"fold":>12} {"speedup":>8}')
+    for text in entries:
+        text = oedlib.render_markup(oedlib.decode_entities(text))
+        before = bench(lambda text: fold_per_char(text, width), text, repeat)
+        after = bench(lambda text: oedlib.Dictionary.fold(text, width),
+            text, repeat)
+        print(f'{len(text):>10} {before * 1000:>10.2f}ms '
+            f'{after * 1000:>10.2f}ms {before / after:>7.1f}x')
+    print()
+
+# Time a call, returning its result and the seconds taken
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def print_stage(name, seconds, items, size):
+    throughput = f'{size / seconds / 1e6:>8.1f}MB/s' if size else f'{"-":>12}'
+    print(f'{name:<10} {items:>9} {seconds * 1000:>10.1f}ms '
+        f'{seconds / items * 1e6:>10.1f}us {throughput}')
+
+# Time each stage of a lookup over the first num_blocks blocks of oed.t:
+# building and loading the index of hw.t, searching it, inflating blocks,
+# decoding, rendering and folding entries, then exporting the same blocks
+# with a pool of processes
+def bench_stages(directory, num_blocks, queries, jobs, width=80):
+    hw_path = os.path.join(directory, 'hw.t')
+    oed_path = os.path.join(directory, 'oed.t')
+    print('Stages')
+    print(f'{"stage":<10} {"items":>9} {"total":>12} {"per item":>12} '
+        f'{"throughput":>12}')
+    data, seconds = timed(oedlib.EntryIndex.build, hw_path, b'^',
+        os.stat(hw_path))
+    print_stage('hw build', seconds, oedlib.EntryIndex(data).count,
+        len(data))
+    oedlib.EntryIndex.open(hw_path, b'^')
+    index, seconds = timed(oedlib.EntryIndex.open, hw_path, b'^')
+    print_stage('hw load', seconds, 1, 0)
+    rng = random.Random(0)
+    keys = [index.key(rng.randrange(len(index))) for _ in range(queries)]
+    _, seconds = timed(lambda: [index.lookup(key) for key in keys])
+    print_stage('search', seconds, queries, 0)
+    num_blocks = min(num_blocks, len(oeda.oedlen) - 1)
+    totals = {stage: [0, 0, 0] for stage in
+        ('inflate', 'decode', 'render', 'fold')}
+    def add(stage, seconds, items, size):
+        totals[stage][0] += seconds
+        totals[stage][1] += items
+        totals[stage][2] += size
+    with oedlib.BlockReader(oed_path) as reader:
+        for blk_index in range(num_blocks):
+            blk, seconds = timed(oedlib.Dictionary.decompress_block, reader,
+                oeda.oedlen, blk_index, True)
+            add('inflate', seconds, 1, len(blk))
+            num_entries = oeda.oednum[blk_index + 1] - oeda.oednum[blk_index]
+            entries = [memoryview(blk)[start:end] for start, end in
+                islice(oedlib.entry_spans(blk), num_entries)]
+            definitions, seconds = timed(lambda: [oedlib.decode_entities(
+                oedlib.decode_text(entry)) for entry in entries])
+            add('decode', seconds, len(entries), sum(map(len, entries)))
+            texts, seconds = timed(lambda: [
+                oedlib.render_markup(definition)
+                for definition in definitions])
+            add('render', seconds, len(entries), sum(map(len, definitions)))
+            _, seconds = timed(lambda: [oedlib.Dictionary.fold(text, width)
+                for text in texts])
+            add('fold', seconds, len(entries), sum(map(len, texts)))
+    for stage, (seconds, items, size) in totals.items():
+        print_stage(stage, seconds, items, size)
+    start = time.perf_counter()
+    items = size = 0
+    for _, entries in oedlib.map_blocks(oedlib.export_block,
+            range(num_blocks), jobs, oedlib.init_export_worker,
+            (oed_path, width)):
+        items += len(entries)
+        size += sum(len(text) for _, text in entries)
+    print_stage('export', time.perf_counter() - start, items, size)
+    print(f'\n{num_blocks} blocks, export with {jobs} processes')
+
+# Seconds taken by the fastest of repeat runs of a command
+def best_run(command, repeat, cwd, env):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, input=b'\n',
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+# Parse the output of python -X importtime into (module, depth, self
+# seconds, cumulative seconds)
+def parse_importtime(output):
+    imports = []
+    for line in output.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)', line)
+        if match:
+            imports.append((match.group(4), (len(match.group(3)) - 1) // 2,
+                int(match.group(1)) / 1e6, int(match.group(2)) / 1e6))
+    return imports
+
+# Time the start of oed.py in fresh interpreters: an empty one, importing
+# oedlib, and a lookup run through oed.py. oedlib and oeda are imported from
+# the directory when it has them. Then list the modules that importing oedlib
+# spends most time on.
+def bench_startup(directory, repeat, query='bacon', count=10):
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    env = dict(os.environ, PYTHONPATH=script_dir)
+    script = os.path.join(directory, 'oed.py')
+    if not os.path.exists(script):
+        script = os.path.join(script_dir, 'oed.py')
+    lookup = ['-p', '--no-daemon', '--render-cache-mb', '0', '--dir',
+        directory, query]
+    commands = [('python -c pass', [sys.executable, '-c', 'pass']),
+        ('import oedlib', [sys.executable, '-c', 'import oedlib'])]
+    if os.path.exists(os.path.join(directory, 'oed.t')):
+        commands.append((f'oed.py -p {query}', [sys.executable, script]
+            + lookup))
+    print('Startup')
+    if sys.flags.dont_write_bytecode:
+        print('PYTHONDONTWRITEBYTECODE is set, so no run uses cached bytecode')
+    print(f'{"command":<28} {"best":>10}')
+    for name, command in commands:
+        # The first run writes bytecode and sidecar files
+        best_run(command, 1, directory, env)
+        seconds = best_run(command, repeat, directory, env)
+        print(f'{name:<28} {seconds * 1000:>8.1f}ms')
+    print()
+    runs = [subprocess.run([sys.executable, '-X', 'importtime', '-c',
+        'import oedlib'], cwd=directory, env=env, capture_output=True,
+        text=True).stderr for _ in range(repeat)]
+    imports = min(map(parse_importtime, runs), key=lambda imports: next(
+        cumulative for module, depth, _, cumulative in imports
+        if module == 'oedlib'))
+    print('Imports of oedlib (python -X importtime)')
+    print(f'{"module":<28} {"self":>10} {"cumulative":>12}')
+    # The modules imported directly by oedlib are listed just before it
+    oed_index = next(i for i, entry in enumerate(imports)
+        if entry[0] == 'oedlib')
+    top = []
+    for entry in reversed(imports[:oed_index]):
+        if entry[1] == 0:
+            break
+        if entry[1] == 1:
+            top.append(entry)
+    for module, _, self_time, cumulative in [imports[oed_index]] + sorted(
+            top, key=lambda entry: -entry[3])[:count]:
+        print(f'{module:<28} {self_time * 1000:>8.1f}ms '
+            f'{cumulative * 1000:>10.1f}ms')
+
+# Import oedlib, with the block tables of the directory if it has its own
+# oeda.py, as written by fixture.py
+def import_oedlib(directory):
+    global oedlib, oeda
+    if os.path.exists(os.path.join(directory, 'oeda.py')):
+        sys.path.insert(0, directory)
+    import oedlib
+    import oeda
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the lookup path of oed.py')
+    parser.add_argument('--dir', default=os.path.dirname(
+        os.path.realpath(__file__)), help='dictionary directory')
+    parser.add_argument('-n', '--entries', type=int, default=3, help='number of entries to time (default: 3)')
+    parser.add_argument('-b', '--blocks', type=int, help='blocks of oed.t to search for large entries or to time with --stages (default: all)')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='repetitions per measurement (default: 5)')
+    parser.add_argument('-s', '--stages', action='store_true', help='time each stage of lookups and exports instead')
+    parser.add_argument('-q', '--queries', type=int, default=1000, help='searches timed by --stages (default: 1000)')
+    parser.add_argument('--startup', action='store_true', help='time the start of oed.py in fresh interpreters instead')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='processes used for the export by --stages (default: number of CPUs)')
+    args = parser.parse_args()
+    if args.startup:
+        bench_startup(os.path.realpath(args.dir), args.repeat)
+        return
+    import_oedlib(args.dir)
+    oed_path = os.path.join(args.dir, 'oed.t')
+    if args.stages:
+        if not os.path.exists(oed_path):
+            parser.error(f'{oed_path} not found, write one with fixture.py')
+        bench_stages(args.dir, args.blocks or len(oeda.oedlen) - 1,
+            args.queries, args.jobs)
+        return
+    if os.path.exists(oed_path):
+        entries = largest_entries(oed_path, args.entries, args.blocks)
+    else:
+        print(f'{oed_path} not found, using synthetic entries\n')
+        entries = synthetic_entries(args.entries, 500000)
+    bench_entities(entries, args.repeat)
+    bench_render(entries, args.repeat)
+    bench_fold(entries, args.repeat)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/python3 -u
+
+# Writes synthetic dictionary files in the format of the OED CD: hw.t, ky.t
+# and oed.t, and a copy of oeda.py with the block tables of the new oed.t.
+# The text is random, but the markup, the entities and the distribution of
+# entry sizes resemble the real data, so oed.py and bench.py can be run on
+# machines without the licensed files. Copy oed.py and oedlib.py into the
+# directory to use them there; bench.py takes the directory with --dir.
+
+import argparse
+import oeda
+import oedlib
+import os
+import random
+import re
+import zlib
+
+# Scale of the real files
+REAL_ENTRIES = oeda.oednum[-1]
+REAL_BLOCKS = len(oeda.oedlen) - 1
+
+syllables = ['ba', 'con', 'set', 'run', 'ter', 'al', 'ing', 'ous', 'ble', 'ca',
+    'fe', 'lo', 'gi', 'an', 'ti', 'or', 'mi', 'de', 'pre', 'un', 'sta', 'tion',
+    'ly', 'ness', 'ment', 'er', 'ic', 'en', 'po', 're']
+parts_of_speech = ['n.', 'v.', 'a.', 'adv.', 'int.', 'prep.', 'conj.']
+# Real headwords and the sizes of their entries: 'set' has the largest in
+# the OED
+headwords = {'set': 400000, 'run': 300000, 'go': 200000, 'take': 150000,
+    'bacon': 4000, 'baconian': 2000, 'bacon-bit': 500, 'caf&eacu;': 1000,
+    '&ae;ther': 3000, '&Ae;sir': 1500}
+
+def make_word(rng):
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))
+
+def make_headwords(rng, count):
+    entity_names = [name for name, _ in oeda.entities[:200]]
+    words = list(headwords)[:count]
+    seen = set(words)
+    while len(words) < count:
+        word = make_word(rng)
+        r = rng.random()
+        if r < 0.05:
+            word += ' ' + make_word(rng)
+        elif r < 0.08:
+            word += '-' + make_word(rng)
+        elif r < 0.10:
+            word = word[:2] + rng.choice(entity_names) + word[2:]
+        if word in seen:
+            continue
+        seen.add(word)
+        words.append(word)
+        # Homographs
+        if rng.random() < 0.05 and len(words) < count:
+            words.append(word)
+    return sorted(words, key=lambda word: oedlib.fold_key(
+        oedlib.decode_entities(word)))
+
+# Snippets of markup that entries are made of
+def make_snippets(rng, count):
+    entity_names = [name for name, _ in oeda.entities]
+    snippets = []
+    for _ in range(count):
+        words = [make_word(rng) for _ in range(rng.randint(4, 16))]
+        for i in range(len(words)):
+            r = rng.random()
+            if r < 0.08:
+                words[i] = rng.choice(entity_names)
+            elif r < 0.12:
+                words[i] = f'<i>{words[i]}</i>'
+            elif r < 0.14:
+                words[i] = f'<xr>{words[i]}</xr>'
+            elif r < 0.15:
+                words[i] = f'<ps>{words[i]}</ps>'
+        r = rng.random()
+        if r < 0.3:
+            words.insert(0, f'<b>{rng.randint(1, 30)}.</b>')
+        elif r < 0.4:
+            words.append('<br>')
+        elif r < 0.45:
+            words.append(f'<upd>{make_word(rng)}</upd>')
+        snippets.append(' '.join(words))
+    return snippets
+
+def make_entry(rng, headword, size, snippets):
+    parts = [f'<e><hw>{headword}</hw> <d>{rng.choice(parts_of_speech)}</d>']
+    length = len(parts[0])
+    while length < size:
+        if rng.random() < 0.05:
+            part = f'<sube><hw>{headword} {make_word(rng)}</hw> ' \
+                f'{rng.choice(snippets)}</sube>'
+        else:
+            part = rng.choice(snippets)
+        parts.append(part)
+        length += len(part) + 1
+    parts.append('</e>')
+    return ' '.join(parts)
+
+# Size of an entry in characters, skewed like the real ones: most entries are
+# a couple of kilobytes, a few run to hundreds
+def entry_size(rng, headword, large):
+    return large.pop(headword, None) or min(
+        int(rng.lognormvariate(7.2, 1.0)), 100000)
+
+# Number of entries in each block, about equal
+def block_sizes(rng, num_entries, num_blocks):
+    per_block = num_entries / num_blocks
+    bounds = [0]
+    for i in range(1, num_blocks):
+        jitter = rng.uniform(-0.1, 0.1) * per_block
+        bounds.append(max(bounds[-1] + 1, min(num_entries - num_blocks + i,
+            int(i * per_block + jitter))))
+    bounds.append(num_entries)
+    return bounds
+
+# Copy of oeda.py with the block tables replaced
+def write_tables(filename, oedlen, oednum):
+    with open(oeda.__file__, encoding='utf-8') as f:
+        source = f.read()
+    for name, table in (('oedlen', oedlen), ('oednum', oednum)):
+        source = re.sub(r'^%s = \[[^\]]*\]' % name,
+            lambda match: '%s = %r' % (name, table), source, count=1,
+            flags=re.M)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(source)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write synthetic OED dictionary files')
+    parser.add_argument('dir', help='directory to write the files to')
+    parser.add_argument('-n', '--entries', type=int, default=REAL_ENTRIES // 10, help=f'number of entries (default: {REAL_ENTRIES // 10}, the real files have {REAL_ENTRIES})')
+    parser.add_argument('-b', '--blocks', type=int, help=f'number of blocks in oed.t (default: in proportion to the {REAL_BLOCKS} real blocks)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed (default: 0)')
+    args = parser.parse_args()
+    num_blocks = args.blocks or max(1, round(
+        args.entries * REAL_BLOCKS / REAL_ENTRIES))
+    if not 0 < num_blocks <= args.entries:
+        parser.error('there must be between 1 block and one per entry')
+    rng = random.Random(args.seed)
+    os.makedirs(args.dir, exist_ok=True)
+    words = make_headwords(rng, args.entries)
+    with open(os.path.join(args.dir, 'hw.t'), 'wb') as f:
+        f.write(zlib.compress('^'.join(words).encode('utf-8'), 9))
+    keys = [oedlib.fold_key(oedlib.decode_entities(word)) for word in words]
+    with open(os.path.join(args.dir, 'ky.t'), 'wb') as f:
+        f.write(zlib.compress(('#' + '#'.join(keys)).encode('utf-8'), 9))
+    snippets = make_snippets(rng, 5000)
+    # Blocks are compressed from the first entry on, with the zlib header
+    # overwritten as in oed.t
+    oednum = block_sizes(rng, args.entries, num_blocks)
+    oedlen = [0]
+    large = dict(headwords)
+    with open(os.path.join(args.dir, 'oed.t'), 'wb') as f:
+        for blk_index in range(num_blocks):
+            entries = [make_entry(rng, words[i],
+                entry_size(rng, words[i], large), snippets)
+                for i in range(oednum[blk_index], oednum[blk_index + 1])]
+            comp_data = bytearray(zlib.compress(
+                ('#' + '#'.join(entries)).encode('utf-8'), 9))
+            comp_data[:2] = rng.randbytes(2)
+            f.write(comp_data)
+            oedlen.append(oedlen[-1] + len(comp_data))
+    write_tables(os.path.join(args.dir, 'oeda.py'), oedlen, oednum)
+    print(f'Wrote {args.entries} entries in {num_blocks} blocks '
+        f'({oedlen[-1]} bytes) to {args.dir}')
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,8 @@
 # Entities were copied from a decompiled script called EntityMapper.as. The
 # script was extracted from OED.swf using the JPEXS Free Flash Decompiler.
 
+from array import array
+
 # Offsets of zlib-compressed blocks in oed.t (app.n:016D3B)
 oedlen = [ 0, 188450, 372204, 553054, 733739, 908734, 1088733, 1271531, 1446757,
 1620561, 1800820, 1974320, 2158495, 2335889, 2522798, 2703901, 2883776, 3065524,
@@ -254,6 +256,10 @@ oednum = [ 0, 326, 702, 1062, 1391, 1815, 2232, 2573, 2969, 3357, 3733, 4140,
 293544, 293701, 293973, 294164, 294269, 294690, 294996, 295405, 295664, 296052,
 296523, 297076, 297478, 297821, 297958 ]
 
+# Compact typed copies of the tables above
+oedlen = array('I', oedlen)
+oednum = array('I', oednum)
+
 # Complete list of entities (OED.swf:scripts/EntityMapper.as)
 entities = [
          ("&Aacu;","Á"),
@@ -0,0 +1,2633 @@
+# The implementation of oed.py, which only imports and runs main. Unlike a
+# script, an imported module has its bytecode cached, so this is not compiled
+# again on every run.
+
+import json
+import logging
+import hashlib
+import heapq
+import html
+import mmap
+import os
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, deque, namedtuple
+from functools import lru_cache, partial
+from itertools import accumulate, islice
+# Modules that only some modes need, such as asyncio for --http or readline
+# and subprocess for the prompt and the pager, are imported where they are
+# used so that they do not slow down every start
+
+class color:
+   MAGENTA = '\033[95m'
+   CYAN = '\033[96m'
+   DARKCYAN = '\033[36m'
+   BLUE = '\033[94m'
+   GREEN = '\033[92m'
+   YELLOW = '\033[93m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   UNDERLINE = '\033[4m'
+   END = '\033[0m'
+
+# The HTMLParser subclasses, defined on first use so that html.parser is only
+# imported for markup that render_markup cannot handle and for
+# Dictionary.structure
+@lru_cache(maxsize=None)
+def html_parsers():
+    from html.parser import HTMLParser
+
+    class MyHTMLParser(HTMLParser):
+        def __init__(self, color=True):
+            HTMLParser.__init__(self)
+            self.text = ''
+            self.color = color
+
+        def handle_starttag(self, tag, attrs):
+            if tag == 'br': self.text += '\n'
+            elif not self.color: pass
+            elif tag == 'hw': self.text += color.GREEN + color.BOLD
+            elif tag == 'xr': self.text += color.BLUE
+            elif tag == 'upd': self.text += color.RED
+            elif tag == 'd': self.text += color.MAGENTA + color.BOLD
+            #else: self.text += '<' + tag + '>')
+
+        def handle_endtag(self, tag):
+            if tag == 'e': self.text += '\n\n'
+            elif tag == 'sube': self.text += '\n\n'
+            elif not self.color: pass
+            elif tag == 'hw': self.text += color.END
+            elif tag == 'xr': self.text += color.END
+            elif tag == 'upd': self.text += color.END
+            elif tag == 'd': self.text += color.END
+            #else: self.text += '</' + tag + '>')
+
+        def handle_data(self, data):
+            self.text += data
+
+    # Parses entry markup into nested {'tag': ..., 'children': [...]} nodes
+    # with text as plain strings
+    class StructureParser(HTMLParser):
+        def __init__(self):
+            HTMLParser.__init__(self)
+            self.root = {'tag': None, 'children': []}
+            self.stack = [self.root]
+
+        def handle_starttag(self, tag, attrs):
+            node = {'tag': tag, 'children': []}
+            if attrs:
+                node['attrs'] = dict(attrs)
+            self.stack[-1]['children'].append(node)
+            if tag != 'br':
+                self.stack.append(node)
+
+        def handle_endtag(self, tag):
+            # Close the innermost open tag of this name, ignoring stray end
+            # tags
+            for i in range(len(self.stack) - 1, 0, -1):
+                if self.stack[i]['tag'] == tag:
+                    del self.stack[i:]
+                    break
+
+        def handle_data(self, data):
+            self.stack[-1]['children'].append(data)
+
+    return MyHTMLParser, StructureParser
+
+# Base for the memory-mapped sidecar files kept next to the dictionary files,
+# or in the user's cache directory where the dictionary directory is not
+# writable. A sidecar records the size and mtime of its source file and,
+# when it depends on the blocks of oed.t, a checksum of the block table in
+# oeda. It is ignored once any of them change.
+class Sidecar():
+    MAGIC = b''
+    VERSION = 0
+    SUFFIX = ''
+    # magic, version, byte order, source size, source mtime, table crc, count
+    header = struct.Struct('<4sHHQqII')
+
+    def __init__(self, buf):
+        magic, version, order, self.size, self.mtime, self.crc, self.count = \
+            self.header.unpack_from(buf)
+        if magic != self.MAGIC or version != self.VERSION \
+                or order != self.byte_order():
+            raise ValueError('Incompatible index file')
+        self.buf = buf
+        self.view = memoryview(buf)
+        self.pos = self.header.size
+
+    # Map the next array of the file
+    def section(self, typecode, count):
+        end = self.pos + count * array(typecode).itemsize
+        section = self.view[self.pos:end].cast(typecode)
+        self.pos = end
+        return section
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def byte_order():
+        return 1 if array('H', [1]).tobytes()[0] else 2
+
+    @staticmethod
+    def table_crc():
+        return zlib.crc32(tables().oednum)
+
+    @classmethod
+    def pack_header(cls, st, count):
+        return cls.header.pack(cls.MAGIC, cls.VERSION, cls.byte_order(),
+            st.st_size, st.st_mtime_ns, cls.table_crc(), count)
+
+    def is_current(self, st):
+        return (self.size, self.mtime, self.crc) == (
+            st.st_size, st.st_mtime_ns, self.table_crc())
+
+    # The sidecar of filename in the cache directory, named after the
+    # directory of filename so that dictionaries in different places do not
+    # share it
+    @classmethod
+    def cache_path(cls, filename):
+        realpath = os.path.realpath(filename)
+        return os.path.join(cache_home(), 'oed', 'sidecars', '%08x-%s%s' % (
+            zlib.crc32(os.path.dirname(realpath).encode()),
+            os.path.basename(realpath), cls.SUFFIX))
+
+    # Where to write the sidecar of filename: next to it if its directory is
+    # writable, or else in the cache directory
+    @classmethod
+    def write_path(cls, filename):
+        if os.access(os.path.dirname(filename) or os.curdir, os.W_OK):
+            return filename + cls.SUFFIX
+        path = cls.cache_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    # Return the sidecar for filename, or None if it is missing or stale
+    @classmethod
+    def load(cls, filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        for path in (filename + cls.SUFFIX, cls.cache_path(filename)):
+            try:
+                with open(path, 'rb') as f:
+                    sidecar = cls(mmap.mmap(f.fileno(), 0,
+                        access=mmap.ACCESS_READ))
+            except (OSError, ValueError, struct.error):
+                continue
+            if sidecar.is_current(st):
+                sidecar.path = path
+                return sidecar
+        return None
+
+    # Write the parts of the sidecar for filename, and map it
+    @classmethod
+    def save(cls, filename, *parts):
+        path = cls.write_path(filename)
+        logging.info('Writing %s' % path)
+        write_atomic(path, *parts)
+        return cls.load(filename)
+
+    # Return the sidecar for filename, building it with build(st) if it is
+    # missing or stale. One that cannot be written is kept in memory.
+    @classmethod
+    def open(cls, filename, build):
+        sidecar = cls.load(filename)
+        if sidecar is not None:
+            return sidecar
+        logging.info('Building %s%s' % (filename, cls.SUFFIX))
+        data = build(os.stat(filename))
+        try:
+            return cls.save(filename, data)
+        except OSError as e:
+            logging.warning('Cannot write %s%s, keeping it in memory: %s'
+                % (filename, cls.SUFFIX, e))
+            return cls(data)
+
+class EntryNotFoundError(LookupError):
+    pass
+
+# Sidecar for the tables of oeda.py: the offsets of the blocks of oed.t, the
+# first entry of each block and the entities. Importing oeda.py means
+# compiling 53 KB of source whenever its bytecode is not cached, so the tables
+# are packed into oeda.py.tbl on first use and mapped from there.
+class Tables(Sidecar):
+    MAGIC = b'OEDA'
+    VERSION = 1
+    SUFFIX = '.tbl'
+
+    def __init__(self, buf):
+        Sidecar.__init__(self, buf)
+        # oedlen and oednum both end with a sentinel past the last block
+        self.oedlen = self.section('I', self.count + 1)
+        self.oednum = self.section('I', self.count + 1)
+        text_size, = self.section('I', 1)
+        parts = str(self.section('B', text_size), 'utf-8').split('\0')
+        self.entities = list(zip(parts[0::2], parts[1::2]))
+        entity_chars = dict(self.entities)
+
+        # Character of an entity found by entity_pattern
+        def replace_entity(match):
+            entity = match.group()
+            return entity_chars.get(entity, entity)
+        self.replace_entity = replace_entity
+
+    # The sidecars of oed.t are checked against these tables, and these only
+    # against oeda.py
+    @staticmethod
+    def table_crc():
+        return 0
+
+    # Return the block containing an entry and the entry's index in that
+    # block
+    def locate(self, entry_index):
+        blk_index = bisect_right(self.oednum, entry_index) - 1
+        if entry_index < 0 or blk_index >= len(self.oedlen) - 1:
+            raise EntryNotFoundError(
+                f'Entry {entry_index} is not in any block')
+        return blk_index, entry_index - self.oednum[blk_index]
+
+    @classmethod
+    def build(cls, st):
+        import oeda
+        text = '\0'.join(part for entity in oeda.entities
+            for part in entity).encode('utf-8')
+        return b''.join([cls.pack_header(st, len(oeda.oedlen) - 1),
+            array('I', oeda.oedlen).tobytes(),
+            array('I', oeda.oednum).tobytes(),
+            array('I', [len(text)]).tobytes(), text])
+
+    # Open the tables of oeda.py at filename, packing them if missing or stale
+    @classmethod
+    def open(cls, filename):
+        return super().open(filename, cls.build)
+
+# The tables of the oeda.py that import would find, loaded on first use
+@lru_cache(maxsize=None)
+def tables():
+    for directory in sys.path:
+        filename = os.path.join(directory or os.curdir, 'oeda.py')
+        if os.path.exists(filename):
+            return Tables.open(filename)
+    raise FileNotFoundError('oeda.py not found, put it next to oedlib.py')
+
+# Sidecar for the entry lists in hw.t and ky.t. Besides the raw entries it
+# holds their entity-decoded keys and the same keys folded by fold_key, each
+# with their sorted order for prefix searches.
+class EntryIndex(Sidecar):
+    MAGIC = b'OEDX'
+    VERSION = 5
+    SUFFIX = '.idx'
+
+    def __init__(self, buf):
+        Sidecar.__init__(self, buf)
+        self.offsets = self.section('I', self.count + 1)
+        self.key_offsets = self.section('I', self.count + 1)
+        self.folded_offsets = self.section('I', self.count + 1)
+        self.order = self.section('I', self.count)
+        self.folded_order = self.section('I', self.count)
+        self.text = self.section('B', self.offsets[-1])
+        self.key_text = self.section('B', self.key_offsets[-1])
+        self.folded_text = self.section('B', self.folded_offsets[-1])
+        self.sorted_keys = SortedKeys(self.key, self.order)
+        self.sorted_folded_keys = SortedKeys(self.folded_key,
+            self.folded_order)
+
+    # The entries do not depend on the blocks of oed.t
+    @staticmethod
+    def table_crc():
+        return 0
+
+    def __getitem__(self, i):
+        i = self.check_index(i)
+        return str(self.text[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    # Entity-decoded entry
+    def key(self, i):
+        i = self.check_index(i)
+        return str(self.key_text[self.key_offsets[i]:self.key_offsets[i + 1]],
+            'utf-8')
+
+    # Key without diacritics, ligatures or case
+    def folded_key(self, i):
+        i = self.check_index(i)
+        return str(self.folded_text[self.folded_offsets[i]:
+            self.folded_offsets[i + 1]], 'utf-8')
+
+    def check_index(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('entry index out of range')
+        return i
+
+    # Find entries whose key is query or starts with query followed by a word
+    # boundary, e.g. 'bacon' matches 'bacon' and 'bacon-bit' but not
+    # 'baconian'. The query is a literal string, not a pattern. Entries that
+    # only match once both are folded, e.g. 'cafe' and 'café', come last.
+    def lookup(self, query):
+        exact = sorted(self.lookup_sorted(self.sorted_keys, query))
+        folded = set(self.lookup_sorted(self.sorted_folded_keys,
+            fold_key(query))).difference(exact)
+        return [(i, self.key(i)) for i in exact + sorted(folded)]
+
+    @staticmethod
+    def lookup_sorted(keys, query):
+        n = len(query)
+        matches = []
+        j = bisect_left(keys, query)
+        while j < len(keys):
+            key = keys[j]
+            if not key.startswith(query):
+                break
+            if len(key) == n or is_word_boundary(key, n):
+                matches.append(keys.order[j])
+                j += 1
+            else:
+                # Skip all keys sharing the character that breaks the word
+                bound = query + chr(min(ord(key[n]) + 1, sys.maxunicode))
+                j = bisect_left(keys, bound, j + 1)
+        return matches
+
+    # Return the entries whose key is exactly key
+    def find(self, key):
+        keys = self.sorted_keys
+        j = bisect_left(keys, key)
+        matches = []
+        while j < len(keys) and keys[j] == key:
+            matches.append(self.order[j])
+            j += 1
+        return matches
+
+    # Serialize the entries of a compressed list file into index format
+    @classmethod
+    def build(cls, filename, separator, st):
+        with open(filename, 'rb') as f:
+            text = zlib.decompress(f.read()).decode('utf-8')
+        sep = separator.decode()
+        entries = text.split(sep)
+        if separator == b'#':
+            entries = entries[1:]
+        # Split before decoding, as &hash; decodes to the separator of ky.t
+        keys = [decode_entities(e) if '&' in e else e for e in entries]
+        entries = [e.encode('utf-8') for e in entries]
+        folded = [fold_key(k) for k in keys]
+        order = array('I', sorted(range(len(keys)), key=keys.__getitem__))
+        folded_order = array('I', sorted(range(len(folded)),
+            key=folded.__getitem__))
+        keys = [k.encode('utf-8') for k in keys]
+        folded = [k.encode('utf-8') for k in folded]
+        offsets = array('I', accumulate(map(len, entries), initial=0))
+        key_offsets = array('I', accumulate(map(len, keys), initial=0))
+        folded_offsets = array('I', accumulate(map(len, folded), initial=0))
+        header = cls.pack_header(st, len(entries))
+        return b''.join([header, offsets.tobytes(), key_offsets.tobytes(),
+            folded_offsets.tobytes(), order.tobytes(), folded_order.tobytes(),
+            *entries, *keys, *folded])
+
+    # Open the sidecar for filename, (re)building it if missing or stale
+    @classmethod
+    def open(cls, filename, separator):
+        return super().open(filename, partial(cls.build, filename, separator))
+
+# Sidecar for oed.t recording the block of every entry and its position in
+# the decompressed block, so an entry can be sliced out without splitting
+# the whole block. It is built once with --build-catalog.
+class EntryCatalog(Sidecar):
+    MAGIC = b'OEDC'
+    VERSION = 1
+    SUFFIX = '.cat'
+    NO_BLOCK = 0xffff
+
+    def __init__(self, buf):
+        Sidecar.__init__(self, buf)
+        self.offsets = self.section('I', self.count)
+        self.lengths = self.section('I', self.count)
+        self.blocks = self.section('H', self.count)
+
+    # Return (block index, offset, length) of an entry, or None if unknown
+    def locate(self, entry_index):
+        if not 0 <= entry_index < self.count \
+                or self.blocks[entry_index] == self.NO_BLOCK:
+            return None
+        return (self.blocks[entry_index], self.offsets[entry_index],
+            self.lengths[entry_index])
+
+    @classmethod
+    def build(cls, filename, st):
+        count = tables().oednum[-1]
+        offsets = array('I', [0]) * count
+        lengths = array('I', [0]) * count
+        blocks = array('H', [cls.NO_BLOCK]) * count
+        with BlockReader(filename) as reader:
+            for blk_index in range(len(tables().oedlen) - 1):
+                blk = Dictionary.decompress_block(
+                    reader, tables().oedlen, blk_index, True)
+                first = tables().oednum[blk_index]
+                num_entries = tables().oednum[blk_index + 1] - first
+                spans = list(entry_spans(blk))
+                if len(spans) != num_entries:
+                    logging.warning('Block %d has %d entries, expected %d' % (
+                        blk_index, len(spans), num_entries))
+                for i, (start, end) in enumerate(spans[:num_entries]):
+                    offsets[first + i] = start
+                    lengths[first + i] = end - start
+                    blocks[first + i] = blk_index
+        return b''.join([cls.pack_header(st, count), offsets.tobytes(),
+            lengths.tobytes(), blocks.tobytes()])
+
+    @classmethod
+    def create(cls, filename):
+        logging.info('Building catalog %s%s' % (filename, cls.SUFFIX))
+        return cls.save(filename, cls.build(filename, os.stat(filename)))
+
+# Read-only access to oed.t shared by all lookups. The file is opened once
+# and memory-mapped, so reads return zero-copy slices and need no seek
+# position, which lets several threads read at once. Where the file cannot
+# be mapped, reads fall back to os.pread.
+class BlockReader():
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.lock = threading.Lock()
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.map = None
+        self.view = memoryview(self.map) if self.map is not None else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, offset, size):
+        if self.view is not None:
+            return self.view[offset:offset + size]
+        if hasattr(os, 'pread'):
+            return os.pread(self.file.fileno(), size, offset)
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(size)
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.map.close()
+            self.view = self.map = None
+        self.file.close()
+
+# Decompress a block whose zlib magic (78 DA) was overwritten. Rather than
+# patching a copy of the data, the header is skipped and the raw deflate
+# stream is inflated, with the Adler-32 trailer checked by hand.
+def inflate_block(comp_data):
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    blk = decompressor.decompress(memoryview(comp_data)[2:])
+    checksum = int.from_bytes(decompressor.unused_data[:4], 'big')
+    if not decompressor.eof or checksum != zlib.adler32(blk):
+        raise zlib.error('Block is truncated or corrupt')
+    return blk
+
+# Decode the text of an entry. Non-ASCII characters are stored as UTF-8 as
+# in hw.t, but a stray invalid byte should not abort the lookup.
+def decode_text(data):
+    return str(data, 'utf-8', 'replace')
+
+# Yield (start, end) of each '#'-separated entry in a decompressed block
+def entry_spans(blk):
+    start = blk.find(b'#')
+    while start >= 0:
+        end = blk.find(b'#', start + 1)
+        yield start + 1, len(blk) if end < 0 else end
+        start = end
+
+# Return (start, end) of entry entry_blk_index without splitting the block
+def find_entry(blk, entry_blk_index):
+    start = -1
+    for _ in range(entry_blk_index + 1):
+        start = blk.find(b'#', start + 1)
+        if start < 0:
+            raise IndexError('entry index out of range')
+    end = blk.find(b'#', start + 1)
+    return start + 1, len(blk) if end < 0 else end
+
+# Sequence of entry keys in sorted order, for use with bisect
+class SortedKeys():
+    def __init__(self, key, order):
+        self.key = key
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, j):
+        return self.key(self.order[j])
+
+# Same test as the regex \b at position pos of s
+def is_word_boundary(s, pos):
+    before = pos > 0 and (s[pos - 1].isalnum() or s[pos - 1] == '_')
+    after = pos < len(s) and (s[pos].isalnum() or s[pos] == '_')
+    return before != after
+
+# Entity names are alphanumeric; unknown entities are left as they are
+entity_pattern = re.compile(r'&[0-9A-Za-z]+;')
+
+# Replace entities such as &eacu; with their characters in a single pass
+def decode_entities(text):
+    return entity_pattern.sub(tables().replace_entity, text)
+
+# Letters that NFKD does not decompose, as typed without their ligature or
+# stroke
+folded_letters = str.maketrans({'æ': 'ae', 'œ': 'oe', 'ø': 'o', 'ł': 'l',
+    'đ': 'd', 'ħ': 'h', 'ı': 'i'})
+
+# Fold a key for searches that ignore diacritics, ligatures and case, e.g.
+# 'Æsir' to 'aesir' and 'café' to 'cafe'
+def fold_key(key):
+    if key.isascii():
+        return key.lower()
+    key = unicodedata.normalize('NFKD', key)
+    key = ''.join(c for c in key if not unicodedata.combining(c))
+    return key.casefold().translate(folded_letters)
+
+# Start and end tags of the entry markup, with quoted attribute values that
+# may contain '>', and comments. Tag names are matched as HTMLParser does.
+markup_pattern = re.compile(
+    r'<(/?)([A-Za-z][^\t\n\r\f />\x00]*)(?:[^>"\']|"[^"]*"|\'[^\']*\')*>'
+    r'|<!--.*?-->', re.S)
+
+# Text inserted for start and end tags, as MyHTMLParser does
+markup_starts = {'br': '\n'}
+markup_ends = {'e': '\n\n', 'sube': '\n\n'}
+color_starts = dict(markup_starts, hw=color.GREEN + color.BOLD, xr=color.BLUE,
+    upd=color.RED, d=color.MAGENTA + color.BOLD)
+color_ends = dict(markup_ends, hw=color.END, xr=color.END, upd=color.END,
+    d=color.END)
+
+# Render entry markup to text in one pass over its tags, collecting the
+# pieces in a list. Markup with a '<' that is not part of a tag falls back to
+# MyHTMLParser, which alone knows how HTMLParser treats it.
+def render_markup(markup, color=True):
+    starts, ends = (color_starts, color_ends) if color \
+        else (markup_starts, markup_ends)
+    pieces = []
+    append = pieces.append
+    pos = 0
+    tags = 0
+    for match in markup_pattern.finditer(markup):
+        tags += 1
+        start = match.start()
+        if start > pos:
+            append(render_data(markup[pos:start]))
+        pos = match.end()
+        name = match.group(2)
+        if name is None:
+            continue
+        name = name.lower()
+        if not match.group(1):
+            append(starts.get(name, ''))
+            # <br/> is a start tag and an end tag
+            if markup[pos - 2] != '/':
+                continue
+        append(ends.get(name, ''))
+    if pos < len(markup):
+        append(render_data(markup[pos:]))
+    if markup.count('<') != tags:
+        MyHTMLParser, _ = html_parsers()
+        parser = MyHTMLParser(color)
+        parser.feed(markup)
+        parser.close()
+        return parser.text
+    return ''.join(pieces)
+
+# HTMLParser also unescapes character references in the text between tags
+def render_data(data):
+    return html.unescape(data) if '&' in data else data
+
+# Color codes, and runs of three or more spaces that fold shortens to two
+ansi_pattern = re.compile(r'\x1b[^m]*m?')
+spaces_pattern = re.compile(r' {3,}')
+zero_width_chars = frozenset('\u200b\u200c\u200d\u2060\ufeff')
+
+# Columns taken by a character on a terminal: none for combining marks, two
+# for East Asian wide and fullwidth characters
+@lru_cache(maxsize=4096)
+def char_width(c):
+    if unicodedata.combining(c) or c in zero_width_chars \
+            or unicodedata.category(c) in ('Mn', 'Me'):
+        return 0
+    if unicodedata.east_asian_width(c) in ('W', 'F'):
+        return 2
+    return 1
+
+def display_width(text):
+    if '\x1b' in text:
+        text = ansi_pattern.sub('', text)
+    return text_width(text)
+
+def text_width(text):
+    if text.isascii():
+        return len(text)
+    return sum(map(char_width, text))
+
+# Positional inverted index of the words in every entry of oed.t, built with
+# --build-fulltext. Terms are stored in sorted order. For each term the
+# postings list the entries containing it and the word positions within each
+# entry, as delta-coded varints.
+class FulltextIndex(Sidecar):
+    MAGIC = b'OEDF'
+    VERSION = 1
+    SUFFIX = '.fts'
+    # Blocks tokenized per worker task
+    CHUNK = 16
+
+    def __init__(self, buf):
+        Sidecar.__init__(self, buf)
+        self.postings_offsets = self.section('Q', self.count + 1)
+        self.term_offsets = self.section('I', self.count + 1)
+        self.doc_counts = self.section('I', self.count)
+        self.term_text = self.section('B', self.term_offsets[-1])
+        self.postings = self.section('B', self.postings_offsets[-1])
+
+    # Terms in sorted order, for use with bisect
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError('term index out of range')
+        return str(self.term_text[self.term_offsets[i]:
+            self.term_offsets[i + 1]], 'utf-8')
+
+    def find_term(self, term):
+        i = bisect_left(self, term)
+        return i if i < self.count and self[i] == term else None
+
+    # Yield (entry index, positions) for a term, up to entry last if given
+    def iter_postings(self, term_index, last=None):
+        buf = self.postings
+        pos = self.postings_offsets[term_index]
+        end = self.postings_offsets[term_index + 1]
+        entry_index = 0
+        while pos < end:
+            delta, pos = read_varint(buf, pos)
+            entry_index += delta
+            if last is not None and entry_index > last:
+                return
+            freq, pos = read_varint(buf, pos)
+            positions = []
+            position = 0
+            for _ in range(freq):
+                delta, pos = read_varint(buf, pos)
+                position += delta
+                positions.append(position)
+            yield entry_index, positions
+
+    # Return [(entry index, hits)] of the entries matching every word and
+    # "quoted phrase" in query, most hits first
+    def search(self, query):
+        clauses = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            terms = tokenize(phrase or word)
+            if terms:
+                clauses.append(terms)
+        term_ids = {}
+        for term in {term for clause in clauses for term in clause}:
+            term_ids[term] = self.find_term(term)
+            if term_ids[term] is None:
+                return []
+        if not clauses:
+            return []
+        # Start with the rarest clause to keep the candidate set small
+        clauses.sort(key=lambda clause: min(
+            self.doc_counts[term_ids[term]] for term in clause))
+        scores = None
+        for clause in clauses:
+            hits = self.match_phrase([term_ids[term] for term in clause],
+                scores)
+            scores = {entry_index: count + (scores[entry_index] if scores
+                else 0) for entry_index, count in hits.items()}
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    # Return {entry index: occurrences} for a sequence of terms, restricted
+    # to the candidate entries if given
+    def match_phrase(self, term_ids, candidates):
+        order = sorted(range(len(term_ids)),
+            key=lambda k: self.doc_counts[term_ids[k]])
+        positions = [None] * len(term_ids)
+        for k in order:
+            last = max(candidates) if candidates else None
+            positions[k] = {entry_index: entry_positions
+                for entry_index, entry_positions
+                in self.iter_postings(term_ids[k], last)
+                if candidates is None or entry_index in candidates}
+            candidates = positions[k]
+            if not candidates:
+                return {}
+        hits = {}
+        for entry_index in candidates:
+            following = [set(p[entry_index]) for p in positions[1:]]
+            count = sum(1 for start in positions[0][entry_index]
+                if all(start + k + 1 in following[k]
+                    for k in range(len(following))))
+            if count:
+                hits[entry_index] = count
+        return hits
+
+    # Tokenize oed.t in parallel, one run file of sorted postings per chunk
+    # of blocks, then merge the runs into the index
+    @classmethod
+    def create(cls, filename, jobs):
+        logging.info('Building full-text index %s%s' % (filename, cls.SUFFIX))
+        st = os.stat(filename)
+        num_blocks = len(tables().oedlen) - 1
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+        with tempfile.TemporaryDirectory(
+                dir=os.path.dirname(cls.write_path(filename))) as tmp_dir:
+            tasks = [(filename, range(i, min(i + cls.CHUNK, num_blocks)),
+                os.path.join(tmp_dir, '%d.run' % i))
+                for i in range(0, num_blocks, cls.CHUNK)]
+            if jobs == 1:
+                run_paths = list(map(write_fulltext_run, tasks))
+            else:
+                with ProcessPoolExecutor(jobs) as executor:
+                    run_paths = list(executor.map(write_fulltext_run, tasks))
+            postings_path = os.path.join(tmp_dir, 'postings')
+            terms, postings_offsets, doc_counts = merge_fulltext_runs(
+                run_paths, postings_path)
+            term_offsets = array('I', accumulate(map(len, terms), initial=0))
+            with open(postings_path, 'rb') as postings:
+                return cls.save(filename, cls.pack_header(st, len(terms)),
+                    postings_offsets.tobytes(), term_offsets.tobytes(),
+                    doc_counts.tobytes(), b''.join(terms), postings)
+
+# Tokenize the blocks of a task and write their postings to a run file.
+# Each run record holds a term, the first and last entry containing it, the
+# number of entries, and the postings without the delta of the first entry,
+# so records for the same term from consecutive runs can be joined.
+def write_fulltext_run(task):
+    filename, blk_indexes, run_path = task
+    postings = {}
+    with BlockReader(filename) as reader:
+        for blk_index in blk_indexes:
+            blk = Dictionary.decompress_block(reader, tables().oedlen,
+                blk_index, True)
+            first = tables().oednum[blk_index]
+            num_entries = tables().oednum[blk_index + 1] - first
+            for i, (start, end) in enumerate(
+                    islice(entry_spans(blk), num_entries)):
+                entry_index = first + i
+                term_positions = {}
+                text = plain_text(memoryview(blk)[start:end])
+                for position, term in enumerate(tokenize(text)):
+                    term_positions.setdefault(term, []).append(position)
+                for term, positions in term_positions.items():
+                    record = postings.get(term)
+                    if record is None:
+                        record = postings[term] = [entry_index, entry_index, 0,
+                            bytearray()]
+                    else:
+                        put_varint(record[3], entry_index - record[1])
+                        record[1] = entry_index
+                    record[2] += 1
+                    put_varint(record[3], len(positions))
+                    previous = 0
+                    for position in positions:
+                        put_varint(record[3], position - previous)
+                        previous = position
+    out = bytearray()
+    for term in sorted(postings):
+        first, last, num_docs, data = postings[term]
+        term = term.encode('utf-8')
+        put_varint(out, len(term))
+        out += term
+        for n in (first, last, num_docs, len(data)):
+            put_varint(out, n)
+        out += data
+    with open(run_path, 'wb') as f:
+        f.write(out)
+    return run_path
+
+# Yield (term, run number, first, last, number of entries, postings) from a
+# run file
+def read_fulltext_run(run_path, run_number):
+    with open(run_path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.fstat(f.fileno()).st_size else b''
+    pos = 0
+    while pos < len(buf):
+        size, pos = read_varint(buf, pos)
+        term = str(buf[pos:pos + size], 'utf-8')
+        pos += size
+        first, pos = read_varint(buf, pos)
+        last, pos = read_varint(buf, pos)
+        num_docs, pos = read_varint(buf, pos)
+        size, pos = read_varint(buf, pos)
+        yield term, run_number, first, last, num_docs, buf[pos:pos + size]
+        pos += size
+
+# Merge run files in term order, joining the postings of each term
+def merge_fulltext_runs(run_paths, postings_path):
+    terms = []
+    postings_offsets = array('Q', [0])
+    doc_counts = array('I')
+    runs = [read_fulltext_run(path, n) for n, path in enumerate(run_paths)]
+    with open(postings_path, 'wb') as out:
+        previous_term = None
+        for term, _, first, last, num_docs, data in heapq.merge(*runs):
+            if term != previous_term:
+                if previous_term is not None:
+                    postings_offsets.append(out.tell())
+                terms.append(term.encode('utf-8'))
+                doc_counts.append(0)
+                previous_term = term
+                previous_last = 0
+            head = bytearray()
+            put_varint(head, first - previous_last)
+            out.write(head)
+            out.write(data)
+            previous_last = last
+            doc_counts[-1] += num_docs
+        if previous_term is not None:
+            postings_offsets.append(out.tell())
+    return terms, postings_offsets, doc_counts
+
+def put_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+# Return the varint at pos and the position after it
+def read_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+tag_pattern = re.compile(r'<[^>]*>')
+word_pattern = re.compile(r'\w+')
+
+# Text of an entry with tags removed and entities decoded
+def plain_text(entry):
+    return decode_entities(tag_pattern.sub(' ', decode_text(entry)))
+
+# Split text into case-folded words for full-text search
+def tokenize(text):
+    return word_pattern.findall(text.casefold())
+
+# Sidecar for hw.t holding the distinct headword keys in sorted order and,
+# for the hash of every trigram of the casefolded keys, the keys containing
+# it. It suggests headwords close to a misspelled query, ranking the keys
+# that share the most trigrams with it by edit distance, and narrows down
+# the keys a wildcard or regular expression has to be matched against.
+class TrigramIndex(Sidecar):
+    MAGIC = b'OEDT'
+    VERSION = 2
+    SUFFIX = '.tri'
+
+    def __init__(self, buf):
+        Sidecar.__init__(self, buf)
+        self.term_offsets = self.section('I', self.count + 1)
+        # Keys are sorted by casefolded length, and the keys of length n
+        # start at length_offsets[n]
+        self.num_lengths = self.section('I', 1)[0]
+        self.length_offsets = self.section('I', self.num_lengths)
+        self.num_grams = self.section('I', 1)[0]
+        self.grams = self.section('I', self.num_grams)
+        self.posting_offsets = self.section('I', self.num_grams + 1)
+        self.postings = self.section('I', self.posting_offsets[-1])
+        self.term_text = self.section('B', self.term_offsets[-1])
+
+    # The keys do not depend on the blocks of oed.t
+    @staticmethod
+    def table_crc():
+        return 0
+
+    def term(self, i):
+        return str(self.term_text[self.term_offsets[i]:
+            self.term_offsets[i + 1]], 'utf-8')
+
+    # Index of the first key at least length long
+    def length_start(self, length):
+        return self.length_offsets[max(0, min(length, self.num_lengths - 1))]
+
+    # Return up to count keys within a few edits of query, closest first.
+    # Only keys whose length is within those edits of the query's are
+    # counted, so that long keys sharing many trigrams do not crowd out the
+    # candidates that are compared.
+    def suggest(self, query, count=5, candidates=200):
+        query = query.casefold()
+        max_distance = max(1, min(3, len(query) // 3))
+        start = self.length_start(len(query) - max_distance)
+        end = self.length_start(len(query) + max_distance + 1)
+        shared = Counter()
+        for gram in set(map(gram_hash, trigrams(query))):
+            i = bisect_left(self.grams, gram)
+            if i < self.num_grams and self.grams[i] == gram:
+                lo, hi = self.posting_offsets[i], self.posting_offsets[i + 1]
+                shared.update(self.postings[
+                    bisect_left(self.postings, start, lo, hi):
+                    bisect_left(self.postings, end, lo, hi)])
+        ranked = []
+        for term_index, hits in shared.most_common(candidates):
+            term = self.term(term_index)
+            distance = edit_distance(query, term.casefold(), max_distance)
+            if distance <= max_distance:
+                ranked.append((distance, -hits, term))
+        return [term for _, _, term in sorted(ranked)[:count]]
+
+    # Return the keys matching a compiled pattern and the number of keys it
+    # was tried on. Only keys holding every trigram of the literals the
+    # pattern requires are tried.
+    def match(self, regex, literals):
+        grams = set()
+        for literal in literals:
+            grams.update(gram_hash(literal[i:i + 3])
+                for i in range(len(literal) - 2))
+        if grams:
+            candidates = None
+            for gram in grams:
+                i = bisect_left(self.grams, gram)
+                if i == self.num_grams or self.grams[i] != gram:
+                    return [], 0
+                postings = self.postings[self.posting_offsets[i]:
+                    self.posting_offsets[i + 1]]
+                candidates = set(postings) if candidates is None \
+                    else candidates.intersection(postings)
+            candidates = sorted(candidates)
+        else:
+            candidates = range(self.count)
+        terms = [self.term(i) for i in candidates]
+        return [term for term in terms if regex(term)], len(terms)
+
+    @classmethod
+    def build(cls, filename, headwords, st):
+        terms = sorted(set(headwords.key(i) for i in range(len(headwords))),
+            key=lambda term: (len(term.casefold()), term))
+        lengths = [len(term.casefold()) for term in terms]
+        length_offsets = array('I', (bisect_left(lengths, length)
+            for length in range(max(lengths, default=0) + 2)))
+        postings = {}
+        for term_index, term in enumerate(terms):
+            for gram in set(map(gram_hash, trigrams(term.casefold()))):
+                postings.setdefault(gram, array('I')).append(term_index)
+        grams = array('I', sorted(postings))
+        posting_offsets = array('I', accumulate(
+            (len(postings[gram]) for gram in grams), initial=0))
+        terms = [term.encode('utf-8') for term in terms]
+        term_offsets = array('I', accumulate(map(len, terms), initial=0))
+        return b''.join([cls.pack_header(st, len(terms)),
+            term_offsets.tobytes(),
+            array('I', [len(length_offsets)]).tobytes(),
+            length_offsets.tobytes(), array('I', [len(grams)]).tobytes(),
+            grams.tobytes(), posting_offsets.tobytes(),
+            *(postings[gram].tobytes() for gram in grams), *terms])
+
+    # Open the sidecar for filename, building it from headwords if missing
+    # or stale
+    @classmethod
+    def open(cls, filename, headwords):
+        return super().open(filename, partial(cls.build, filename, headwords))
+
+# An escape in a regular expression: a character given by its code or name,
+# a group reference, or a backslash and the character after it
+escape_pattern = re.compile(r'\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|'
+    r'U[0-9a-fA-F]{8}|0[0-7]{0,2}|[0-7]{3}|[0-9]{1,2}|N\{[^}]*\}|.)',
+    re.DOTALL)
+
+# Literal strings that every match of a regular expression contains,
+# casefolded. The start and end of the pattern, where anchored, are marked
+# with the padding of trigrams. Anything not understood ends a literal, and
+# alternatives give none, so the literals are never more than required.
+def required_literals(pattern):
+    if re.compile(pattern).flags & re.VERBOSE:
+        return []
+    literals = []
+    literal = ''
+    quantifiable = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        atom = None
+        if c == '\\':
+            escape = escape_pattern.match(pattern, i).group()
+            if escape[1] == 'N':
+                atom = unicodedata.lookup(escape[3:-1])
+            elif escape[1] in 'xuU':
+                atom = chr(int(escape[2:], 16))
+            elif escape[1] == '0' or escape[1:].isdigit() and len(escape) == 4:
+                atom = chr(int(escape[1:], 8))
+            elif not escape[1].isalnum():
+                atom = escape[1]
+            i += len(escape)
+        elif c == '|':
+            # Alternatives outside groups share no literal
+            return []
+        elif c == '[':
+            # Skip the class, in which a leading ']' is a member
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+        elif c == '(':
+            depth = 0
+            while i < len(pattern):
+                if pattern[i] == '\\':
+                    i += 1
+                elif pattern[i] == '(':
+                    depth += 1
+                elif pattern[i] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+            i += 1
+        elif c in '*+?{':
+            # A quantified character is optional, or at least no longer
+            # adjacent to what follows
+            if quantifiable and (c in '*?' or pattern.startswith(('{0', '{,'),
+                    i)):
+                literal = literal[:-1]
+            end = pattern.find('}', i) if c == '{' else i
+            i = len(pattern) if end < 0 else end + 1
+            if pattern[i:i + 1] in ('?', '+'):
+                i += 1
+        elif c == '^' and i == 0:
+            literal = '  '
+            i += 1
+            continue
+        elif c == '$' and i == len(pattern) - 1:
+            literal += ' '
+            break
+        elif c not in '.^$':
+            atom = c
+            i += 1
+        else:
+            i += 1
+        quantifiable = atom is not None
+        if atom is None:
+            literals.append(literal)
+            literal = ''
+        else:
+            literal += atom.casefold()
+    literals.append(literal)
+    return [literal for literal in literals if len(literal) >= 3]
+
+# A query between slashes is a regular expression, anything else a wildcard
+# pattern
+def pattern_regex(query):
+    if len(query) > 1 and query.startswith('/') and query.endswith('/'):
+        return query[1:-1]
+    return wildcard_regex(query)
+
+# Translate a wildcard pattern, where * matches any characters and ? any one
+# character, to an anchored regular expression
+def wildcard_regex(pattern):
+    return '^' + ''.join('.*' if c == '*' else '.' if c == '?'
+        else re.escape(c) for c in pattern) + '$'
+
+# Trigrams of a word padded with spaces, so that its start counts for more
+def trigrams(word):
+    word = '  ' + word + ' '
+    return [word[i:i + 3] for i in range(len(word) - 2)]
+
+def gram_hash(gram):
+    return zlib.crc32(gram.encode('utf-8'))
+
+# Levenshtein distance between a and b, or max_distance + 1 once it is known
+# to exceed max_distance
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+# Local copy of oed.t written by --repack, in which entries are compressed in
+# small groups rather than blocks of about 280 entries. All groups share a
+# preset dictionary built from common strings in the corpus, which keeps the
+# file close to the size of oed.t. Fetching an entry inflates one group.
+class PackedCorpus(Sidecar):
+    MAGIC = b'OEDP'
+    VERSION = 1
+    SUFFIX = '.pak'
+    GROUP_BYTES = 16384
+    ZDICT_BYTES = 32768
+    NO_GROUP = 0xffffffff
+
+    def __init__(self, buf):
+        Sidecar.__init__(self, buf)
+        num_groups, zdict_size = self.section('Q', 2)
+        self.group_offsets = self.section('Q', num_groups + 1)
+        self.groups = self.section('I', self.count)
+        self.offsets = self.section('I', self.count)
+        self.lengths = self.section('I', self.count)
+        self.zdict = bytes(self.section('B', zdict_size))
+        self.data = self.section('B', self.group_offsets[-1])
+
+    def entry(self, entry_index):
+        if not 0 <= entry_index < self.count \
+                or self.groups[entry_index] == self.NO_GROUP:
+            raise EntryNotFoundError(
+                f'Entry {entry_index} is not in the packed corpus')
+        group = self.groups[entry_index]
+        comp_data = self.data[self.group_offsets[group]:
+            self.group_offsets[group + 1]]
+        data = zlib.decompressobj(zdict=self.zdict).decompress(comp_data)
+        start = self.offsets[entry_index]
+        return memoryview(data)[start:start + self.lengths[entry_index]]
+
+    @classmethod
+    def create(cls, filename, jobs):
+        logging.info('Repacking %s to %s%s' % (filename, filename, cls.SUFFIX))
+        st = os.stat(filename)
+        num_blocks = len(tables().oedlen) - 1
+        with BlockReader(filename) as reader:
+            samples = [Dictionary.decompress_block(reader, tables().oedlen,
+                i, True)
+                for i in range(0, num_blocks, max(1, num_blocks // 32))]
+        zdict = train_zdict(samples, cls.ZDICT_BYTES)
+        count = tables().oednum[-1]
+        groups = array('I', [cls.NO_GROUP]) * count
+        offsets = array('I', [0]) * count
+        lengths = array('I', [0]) * count
+        group_offsets = array('Q', [0])
+        import tempfile
+        with tempfile.TemporaryFile(
+                dir=os.path.dirname(cls.write_path(filename))) as data:
+            blocks = map_blocks(repack_block, range(num_blocks), jobs,
+                init_repack_worker, (filename, zdict))
+            for blk_index, block_groups in blocks:
+                for comp_data, members in block_groups:
+                    for entry_index, offset, length in members:
+                        groups[entry_index] = len(group_offsets) - 1
+                        offsets[entry_index] = offset
+                        lengths[entry_index] = length
+                    data.write(comp_data)
+                    group_offsets.append(group_offsets[-1] + len(comp_data))
+                logging.info('Repacked block %d' % blk_index)
+            data.seek(0)
+            return cls.save(filename, cls.pack_header(st, count),
+                array('Q', [len(group_offsets) - 1, len(zdict)]).tobytes(),
+                group_offsets.tobytes(), groups.tobytes(), offsets.tobytes(),
+                lengths.tobytes(), zdict, data)
+
+# Build a preset zlib dictionary from the tags and words that save the most
+# bytes across the samples. zlib favours matches at short distances, so the
+# most valuable strings go at the end.
+def train_zdict(samples, size):
+    counts = Counter()
+    for sample in samples:
+        counts.update(re.findall(rb'<[^>]*>|[^<\s]+\s?', sample))
+    pieces = sorted(counts, key=lambda piece: counts[piece] * len(piece),
+        reverse=True)
+    zdict = []
+    total = 0
+    for piece in pieces:
+        if counts[piece] < 2 or total + len(piece) > size:
+            break
+        zdict.append(piece)
+        total += len(piece)
+    return b''.join(reversed(zdict))
+
+# The user's cache directory, for what cannot be kept next to the dictionary
+def cache_home():
+    return os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+
+# Write to a temporary file first so readers never see a partial file. Parts
+# are written in order; file objects are copied.
+def write_atomic(filename, *parts):
+    import shutil
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filename),
+        prefix='.' + os.path.basename(filename))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(f.fileno(), 0o644)
+            for part in parts:
+                if hasattr(part, 'read'):
+                    shutil.copyfileobj(part, f)
+                else:
+                    f.write(part)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+# Decompressed oed.t blocks, least recently used first. The cache is bounded
+# by the total size of the blocks it holds rather than their number, and may
+# be shared by the threads of the daemon.
+class BlockCache():
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.blocks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, blk_index):
+        with self.lock:
+            blk = self.blocks.get(blk_index)
+            if blk is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.blocks.move_to_end(blk_index)
+        logging.info('Block cache %s for block %d (%d hits, %d misses, '
+            '%d bytes in %d blocks)' % ('miss' if blk is None else 'hit',
+            blk_index, self.hits, self.misses, self.size, len(self.blocks)))
+        return blk
+
+    def put(self, blk_index, blk):
+        with self.lock:
+            if len(blk) > self.max_bytes or blk_index in self.blocks:
+                return
+            self.blocks[blk_index] = blk
+            self.size += len(blk)
+            while self.size > self.max_bytes:
+                _, evicted = self.blocks.popitem(last=False)
+                self.size -= len(evicted)
+
+# Rendered text of lookups, kept in files under $XDG_CACHE_HOME/oed so that
+# repeated lookups skip decompression and rendering. A file is named by a hash
+# of the entries, the width, the color mode, the renderer version and the size
+# and mtime of oed.t, and is written atomically, so processes may share the
+# directory. Once it grows past max_bytes the least recently used files are
+# removed.
+class RenderCache():
+    # Bump whenever rendering changes
+    VERSION = 1
+
+    def __init__(self, directory, source, max_bytes):
+        self.directory = directory
+        self.source = source
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    # Return a cache for renders of filename, or None if disabled
+    @classmethod
+    def open(cls, filename, max_bytes):
+        if max_bytes <= 0:
+            return None
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        source = '%s:%d:%d' % (os.path.realpath(filename), st.st_size,
+            st.st_mtime_ns)
+        return cls(os.path.join(cache_home(), 'oed'), source, max_bytes)
+
+    def path(self, entry_indexes, width, color):
+        key = '%s|%s|%s|%d|%d' % (self.source, ','.join(map(str,
+            entry_indexes)), width, color, self.VERSION)
+        return os.path.join(self.directory, hashlib.blake2b(key.encode(),
+            digest_size=16).hexdigest())
+
+    def get(self, entry_indexes, width, color):
+        path = self.path(entry_indexes, width, color)
+        try:
+            with open(path, 'rb') as f:
+                text = f.read().decode('utf-8')
+            # Eviction goes by mtime
+            os.utime(path)
+        except (OSError, UnicodeDecodeError):
+            return None
+        logging.info('Render cache hit for entries %s' % entry_indexes)
+        return text
+
+    def put(self, entry_indexes, width, color, text):
+        data = text.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        path = self.path(entry_indexes, width, color)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            write_atomic(path, data)
+            self.add_size(len(data) - replaced)
+        except OSError as e:
+            logging.info('Cannot write to render cache: %s' % e)
+
+    # Add delta to the total size of the cache, which is kept in the .size
+    # file so that a new process need not scan the directory to learn it.
+    # The file is locked as other processes may be writing too. The
+    # directory is only scanned when the file is missing or when evicting.
+    def add_size(self, delta):
+        import fcntl
+        with self.lock, open(os.path.join(self.directory, '.size'),
+                'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                size = int(f.read()) + delta
+            except ValueError:
+                size = sum(size for _, size, _ in self.scan())
+            if size > self.max_bytes:
+                size = self.evict()
+            f.seek(0)
+            f.truncate()
+            f.write(str(size))
+
+    # Remove the least recently used files until the cache is down to three
+    # quarters of max_bytes, so that it is not evicted on every write, and
+    # return its size
+    def evict(self):
+        files = sorted(self.scan())
+        size = sum(size for _, size, _ in files)
+        for _, file_size, path in files:
+            if size <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        logging.info('Render cache evicted down to %d bytes' % size)
+        return size
+
+    # Return the mtime, size and path of each cached file, skipping the
+    # temporary files of writes in progress and the sidecars directory
+    def scan(self):
+        files = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith('.') or entry.is_dir():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime_ns, st.st_size, entry.path))
+        return files
+
+class DaemonError(Exception):
+    pass
+
+# Connection to a daemon started with --serve. Requests and responses are
+# JSON objects, each preceded by its length as a 4-byte big-endian integer.
+class DaemonClient():
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = sock.makefile('rwb')
+
+    # Return a client if a daemon owned by this user listens on path
+    @classmethod
+    def connect(cls, path):
+        try:
+            if os.stat(path).st_uid != os.getuid():
+                return None
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+        except OSError:
+            return None
+        return cls(sock)
+
+    def request(self, request):
+        try:
+            write_message(self.file, request)
+            response = read_message(self.file)
+        except OSError as e:
+            raise DaemonError(f'Lost connection to daemon: {e}')
+        if response is None:
+            raise DaemonError('Daemon closed the connection')
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response
+
+# The socketserver classes of the daemon, defined on first use so that
+# socketserver is only imported for --serve
+@lru_cache(maxsize=None)
+def daemon_classes():
+    import socketserver
+
+    # Serves each client connection in its own thread until it disconnects
+    class DaemonHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    request = read_message(self.rfile)
+                except (OSError, ValueError) as e:
+                    logging.warning('Bad request: %s' % e)
+                    return
+                if request is None:
+                    return
+                start_time = time.monotonic()
+                try:
+                    response = self.server.oed_search.handle_request(request)
+                except Exception as e:
+                    logging.exception('Request %r failed' % request)
+                    response = {'error': str(e)}
+                logging.info('%s %r in %.1f ms' % (request.get('op'),
+                    request.get('query'),
+                    (time.monotonic() - start_time) * 1000))
+                try:
+                    write_message(self.wfile, response)
+                except OSError:
+                    return
+
+    class DaemonServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    return DaemonHandler, DaemonServer
+
+message_header = struct.Struct('>I')
+MAX_MESSAGE_BYTES = 1 << 28
+
+def write_message(f, message):
+    data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    f.write(message_header.pack(len(data)) + data)
+    f.flush()
+
+# Return the next message, or None at end of stream
+def read_message(f):
+    header = f.read(message_header.size)
+    if len(header) < message_header.size:
+        return None
+    size, = message_header.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise ValueError(f'Message of {size} bytes is too large')
+    data = f.read(size)
+    if len(data) < size:
+        return None
+    return json.loads(data)
+
+# Time, calls and bytes produced by each stage of a query, and the peak of
+# memory traced by tracemalloc while it ran, for --timings. The time of a
+# stage excludes the stages it calls, so the times add up.
+class Timings():
+    def __init__(self, query):
+        self.query = query
+        self.stages = {}
+        self.nested = 0.0
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def measure(self, stage, func, *args):
+        outer = self.nested
+        self.nested = 0.0
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            seconds = elapsed - self.nested
+            self.nested = outer + elapsed
+        size = len(result) if isinstance(result,
+            (bytes, bytearray, memoryview, str)) else 0
+        totals = self.stages.setdefault(stage, [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        totals[2] += size
+        return result
+
+    def record(self):
+        import tracemalloc
+        return {'query': self.query,
+            'ms': round(sum(t[0] for t in self.stages.values()) * 1000, 3),
+            'peak_bytes': tracemalloc.get_traced_memory()[1]
+                if tracemalloc.is_tracing() else None,
+            'stages': {stage: {'ms': round(seconds * 1000, 3),
+                'calls': calls, 'bytes': size}
+                for stage, (seconds, calls, size) in self.stages.items()}}
+
+    def print(self, file):
+        record = self.record()
+        print(f'Timings for {self.query}', file=file)
+        print(f'{"stage":<8} {"calls":>6} {"time":>12} {"bytes":>12}',
+            file=file)
+        for stage, totals in record['stages'].items():
+            print(f'{stage:<8} {totals["calls"]:>6} {totals["ms"]:>10.3f}ms '
+                f'{totals["bytes"]:>12}', file=file)
+        print(f'{"total":<8} {"":>6} {record["ms"]:>10.3f}ms', file=file)
+        if record['peak_bytes'] is not None:
+            print(f'peak memory {record["peak_bytes"]} bytes', file=file)
+        print(file=file)
+
+# Call func, adding the time it took and the size of its result to timings,
+# the Timings of the current query or None when they are not collected
+def timed(timings, stage, func, *args):
+    if timings is None:
+        return func(*args)
+    return timings.measure(stage, func, *args)
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+# An entry found by Dictionary.search
+Match = namedtuple('Match', 'id headword')
+# An entry of oed.t, with its markup decoded
+Entry = namedtuple('Entry', 'id headword block markup')
+
+# Directory of oedlib.py and oed.py, where the dictionary files are by
+# default
+def script_directory():
+    return os.path.dirname(os.path.realpath(__file__))
+
+# The dictionary files of a directory, opened once for any number of lookups
+# by oed.py or by programs that import it:
+#
+#   dictionary = Dictionary('/path/to/oed')
+#   for match in dictionary.search('bacon'):
+#       print(dictionary.render(dictionary.entry(match.id), width=80))
+#
+# Nothing is printed or read from the terminal. Missing files raise
+# FileNotFoundError and entries that are not in oed.t raise
+# EntryNotFoundError, a LookupError. The block tables are those of
+# oeda.py. A Dictionary may be shared between threads.
+class Dictionary():
+    def __init__(self, directory=None, block_cache_mb=64, render_cache_mb=64):
+        self.directory = os.path.realpath(directory or script_directory())
+        self.hw_path = os.path.join(self.directory, 'hw.t')
+        self.ky_path = os.path.join(self.directory, 'ky.t')
+        self.oed_path = os.path.join(self.directory, 'oed.t')
+        self.block_cache = BlockCache(int(block_cache_mb * 1024 * 1024))
+        # Timings of the current query, set by OedSearch for --timings
+        self.timings = None
+        self.headwords = EntryIndex.open(self.hw_path, b'^')
+        self.keys = None
+        self.keys_lock = threading.Lock()
+        self.oed = BlockReader(self.oed_path)
+        self.catalog = EntryCatalog.load(self.oed_path)
+        self.corpus = PackedCorpus.load(self.oed_path)
+        self.render_cache = RenderCache.open(self.oed_path,
+            int(render_cache_mb * 1024 * 1024))
+        self.fulltext_index = None
+        self.fulltext_lock = threading.Lock()
+        self.trigram_index = None
+        self.suggest_lock = threading.Lock()
+        if self.corpus is not None:
+            logging.info('Reading entries from %s' % self.corpus.path)
+        if self.catalog is None:
+            logging.info('No catalog for %s, entries are found by scanning '
+                'their block' % self.oed_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Close oed.t
+    def close(self):
+        self.oed.close()
+
+    # The index of ky.t is only opened, or built, when a search first falls
+    # back to the keys
+    def get_keys(self):
+        with self.keys_lock:
+            if self.keys is None:
+                self.keys = EntryIndex.open(self.ky_path, b'#')
+            return self.keys
+
+    # The full-text index is only opened when first needed
+    def get_fulltext_index(self):
+        with self.fulltext_lock:
+            if self.fulltext_index is None:
+                self.fulltext_index = FulltextIndex.load(self.oed_path)
+            if self.fulltext_index is None:
+                raise FileNotFoundError(f'No full-text index for '
+                    f'{self.oed_path}, build it with --build-fulltext')
+            return self.fulltext_index
+
+    # The trigram index is only opened, or built, when first needed
+    def get_trigram_index(self):
+        with self.suggest_lock:
+            if self.trigram_index is None:
+                self.trigram_index = TrigramIndex.open(self.hw_path,
+                    self.headwords)
+            return self.trigram_index
+
+    # Find the entries whose headword starts with the words of query, exact
+    # matches first, or with keys those whose key in ky.t does. With pattern,
+    # find the headwords matching a wildcard pattern or /regular expression/,
+    # and with fulltext the entries whose text has the words and "quoted
+    # phrases" of query, best matches first. Returns a list of Match.
+    def search(self, query, keys=False, fulltext=False, pattern=False,
+            limit=None):
+        if keys:
+            return [Match(*result) for result in
+                self.get_keys().lookup(query)]
+        if pattern:
+            return self.find_pattern(query, limit)[0]
+        if fulltext:
+            return self.find_fulltext(query, limit)
+        return [Match(*result) for result in self.headwords.lookup(query)]
+
+    # Headwords close to a query that found nothing
+    def suggest(self, query, count=5):
+        return self.get_trigram_index().suggest(query, count)
+
+    # Find headwords matching a wildcard pattern, or a regular expression
+    # between slashes, and return the first limit entries along with the
+    # number of headwords the pattern was tried on
+    def find_pattern(self, query, limit):
+        pattern = pattern_regex(query)
+        regex = re.compile(pattern)
+        literals = required_literals(pattern)
+        index = self.get_trigram_index()
+        terms, verified = index.match(regex.search, literals)
+        logging.info('%s requires %s, %d of %d headwords verified, %d matched'
+            % (query, literals or 'a full scan', verified, len(index),
+            len(terms)))
+        entry_indexes = []
+        for term in terms:
+            entry_indexes.extend(self.headwords.find(term))
+        return [Match(entry_index, self.headwords.key(entry_index))
+            for entry_index in sorted(entry_indexes)[:limit]], verified
+
+    # Search the text of all entries, best matches first
+    def find_fulltext(self, query, limit):
+        matches = self.get_fulltext_index().search(query)
+        logging.info('%s has %d full-text matches' % (query, len(matches)))
+        results = []
+        for entry_index, hits in matches[:limit]:
+            logging.info('Entry %d has %d hits' % (entry_index, hits))
+            headword = self.headword(entry_index) or str(entry_index)
+            results.append(Match(entry_index, headword))
+        return results
+
+    # Headword of an entry, or None past the end of hw.t
+    def headword(self, entry_index):
+        if entry_index < len(self.headwords):
+            return self.headwords.key(entry_index)
+        return None
+
+    # Return the entry at entry_index of oed.t
+    def entry(self, entry_index):
+        blk_index, entry_blk_index = timed(self.timings, 'locate',
+            self.find_block_index, entry_index)
+        data = timed(self.timings, 'read', self.get_entry_bytes,
+            entry_index, blk_index, entry_blk_index)
+        markup = timed(self.timings, 'decode', self.get_definition, data)
+        return Entry(entry_index, self.headword(entry_index), blk_index,
+            markup)
+
+    # Return the entries with the given indexes by index, decompressing each
+    # block once for all the entries in it. Entries that are not in oed.t are
+    # logged and left out.
+    def entries(self, entry_indexes):
+        blocks = {}
+        for entry_index in entry_indexes:
+            try:
+                blk_index, entry_blk_index = tables().locate(entry_index)
+            except EntryNotFoundError as e:
+                logging.error(e)
+                continue
+            blocks.setdefault(blk_index, {})[entry_index] = entry_blk_index
+        entries = {}
+        for blk_index in sorted(blocks):
+            blk = None
+            if self.corpus is None:
+                blk = self.decompress_block(self.oed, tables().oedlen,
+                    blk_index, True)
+            for entry_index, entry_blk_index in blocks[blk_index].items():
+                if blk is None:
+                    data = self.corpus.entry(entry_index)
+                else:
+                    data = self.slice_entry(blk, entry_index, blk_index,
+                        entry_blk_index)
+                entries[entry_index] = Entry(entry_index,
+                    self.headword(entry_index), blk_index,
+                    self.get_definition(data))
+        logging.info('Read %d entries from %d blocks' % (len(entries),
+            len(blocks)))
+        return entries
+
+    # Yield every entry of oed.t from start_block on, in order
+    def iter_entries(self, start_block=0):
+        for blk_index in range(start_block, len(tables().oedlen) - 1):
+            for entry_index, data in self.read_block(blk_index):
+                yield Entry(entry_index, self.headword(entry_index), blk_index,
+                    self.get_definition(data))
+
+    # Decompress a block and return (entry index, bytes) for its entries
+    def read_block(self, blk_index):
+        blk = self.decompress_block(self.oed, tables().oedlen, blk_index, True)
+        first = tables().oednum[blk_index]
+        num_entries = tables().oednum[blk_index + 1] - first
+        view = memoryview(blk)
+        return [(first + i, view[start:end]) for i, (start, end) in
+            enumerate(islice(entry_spans(blk), num_entries))]
+
+    # Render entries as one text, through the render cache
+    def text(self, entry_indexes, width=None, color=True):
+        if self.render_cache is not None:
+            text = timed(self.timings, 'cache', self.render_cache.get,
+                entry_indexes, width, color)
+            if text is not None:
+                return text
+        markup = ''.join(self.entry(entry_index).markup
+            for entry_index in entry_indexes)
+        text = timed(self.timings, 'render', render_markup, markup, color)
+        if width:
+            text = timed(self.timings, 'fold', self.fold, text, width)
+        if self.render_cache is not None:
+            timed(self.timings, 'cache', self.render_cache.put,
+                entry_indexes, width, color, text)
+        return text
+
+    # Render an entry, or markup, as text, wrapped to width if given
+    @staticmethod
+    def render(entry, width=None, color=True):
+        markup = entry.markup if isinstance(entry, Entry) else entry
+        text = render_markup(markup, color)
+        return Dictionary.fold(text, width) if width else text
+
+    # Parse an entry, or markup, into nested {'tag': ..., 'children': [...]}
+    # nodes
+    @staticmethod
+    def structure(entry):
+        markup = entry.markup if isinstance(entry, Entry) else entry
+        _, StructureParser = html_parsers()
+        parser = StructureParser()
+        parser.feed(markup)
+        parser.close()
+        return parser.root['children']
+
+    @staticmethod
+    def decompress_block(reader, offsets, index, fix_zlib=False):
+        chunksize = offsets[index + 1] - offsets[index]
+        comp_data = reader.read(offsets[index], chunksize)
+        if not fix_zlib:
+            return zlib.decompress(comp_data)
+        return inflate_block(comp_data)
+
+    # Find index of block containing entry contents and the entry's index
+    # within the block
+    def find_block_index(self, entry_index):
+        blk_index, entry_blk_index = tables().locate(entry_index)
+        logging.info('Entry %d is at index %d in block %d at offset %d' % (
+            entry_index, entry_blk_index, blk_index,
+            tables().oedlen[blk_index]))
+        return blk_index, entry_blk_index
+
+    def get_block_bytes(self, reader, blk_array, blk_index):
+        blk = self.block_cache.get(blk_index)
+        if blk is None:
+            blk = timed(self.timings, 'inflate', self.decompress_block, reader,
+                blk_array, blk_index, True)
+            self.block_cache.put(blk_index, blk)
+        return blk
+
+    # Slice a single entry out of its decompressed block without copying it
+    def get_entry_bytes(self, entry_index, blk_index, entry_blk_index):
+        if self.corpus is not None:
+            return self.corpus.entry(entry_index)
+        blk = self.get_block_bytes(self.oed, tables().oedlen, blk_index)
+        return self.slice_entry(blk, entry_index, blk_index, entry_blk_index)
+
+    def slice_entry(self, blk, entry_index, blk_index, entry_blk_index):
+        location = self.catalog and self.catalog.locate(entry_index)
+        if location and location[0] == blk_index:
+            _, start, length = location
+            end = start + length
+        else:
+            start, end = find_entry(blk, entry_blk_index)
+        return memoryview(blk)[start:end]
+
+    # Format definition contents
+    def get_definition(self, entry):
+        return decode_entities(decode_text(entry))
+
+    # Wrap text at width display columns, ignoring color tags
+    @staticmethod
+    def fold(text, width):
+        output = []
+        append = output.append
+        text = text.replace('\u00A0', ' ')
+        text = spaces_pattern.sub('  ', text)
+        for line in text.split('\n'):
+            words = line.split(' ')
+            # Columns of each word, excluding color tags, which have no spaces
+            plain = ansi_pattern.sub('', line) if '\x1b' in line else line
+            if plain.isascii():
+                vlens = map(len, plain.split(' '))
+            else:
+                vlens = map(text_width, plain.split(' '))
+            column = 0
+            start = 0
+            for i, vlen in enumerate(vlens):
+                column += vlen + 1 # Include space
+                if column > width:
+                    column = vlen + 1 # Include space
+                    append(' '.join(words[start:i]))
+                    append(' \n' if i else '\n') # Wrap the text!
+                    start = i
+            append(' '.join(words[start:]))
+            append(' \n')
+        return ''.join(output)
+
+class OedSearch():
+    def __init__(self, args):
+        self.print_only = args.print
+        self.width = args.width
+        self.fulltext = args.fulltext
+        self.pattern = args.pattern
+        self.limit = args.limit
+        self.batch = args.batch
+        self.show_timings = args.timings
+        self.timings_log = args.timings_log
+        self.profile = args.profile
+        self.timings = None
+        debug = args.debug
+        query = args.query
+        if debug:
+            logging.basicConfig(level=logging.INFO)
+        socket_path = args.socket or self.get_socket_path(args.dir)
+        # Forward lookups to a running daemon rather than opening the files
+        self.client = None
+        self.dictionary = None
+        if not (args.serve or args.http or args.no_daemon or args.batch
+                or args.grep or args.export):
+            self.client = DaemonClient.connect(socket_path)
+        if self.client is not None:
+            logging.info('Forwarding queries to daemon at %s' % socket_path)
+        else:
+            try:
+                self.dictionary = Dictionary(args.dir, args.block_cache_mb,
+                    args.render_cache_mb)
+                if self.fulltext:
+                    self.dictionary.get_fulltext_index()
+            except FileNotFoundError as e:
+                logging.error(e)
+                exit(1)
+        if args.serve:
+            self.run_server(socket_path)
+            return
+        if args.http:
+            self.run_http(args.http, args.jobs)
+            return
+        if args.batch:
+            self.run_batch(args.batch, args.format)
+            return
+        if args.grep:
+            self.run_grep(args.grep, args.format, args.jobs)
+            return
+        if args.export:
+            self.run_export(args.export, args.format, args.start_block,
+                args.jobs)
+            return
+        print('Oxford English Dictionary 2nd ed. on CD-ROM (v4.0)')
+        print('Copyright © 2009 Oxford University Press\n')
+        mode = 'print_only' if self.print_only else 'default'
+        print(f'Running in {mode} mode. Use Ctrl-C to quit, Ctrl-D to return.\n')
+        if self.show_timings or self.timings_log:
+            import tracemalloc
+            tracemalloc.start()
+        while True:
+            if not query:
+                query = self.get_query()
+            profiler = self.start_query(query)
+            try:
+                results = timed(self.timings, 'search', self.find_results,
+                    query)
+                if len(results) > 1:
+                    print(f'Found multiple entries matching \'{query}\':\n')
+                # Loop to return to multiple entry selection
+                while self.parse_results(results, query):
+                    pass
+            except DaemonError as e:
+                # Searches, suggestions and texts forwarded to the daemon
+                logging.error(e)
+                if self.print_only:
+                    exit(1)
+                print()
+            finally:
+                self.end_query(profiler)
+            if self.print_only:
+                break
+            query = None
+
+    # Start collecting timings for a query, and profile the first query if
+    # asked to
+    def start_query(self, query):
+        if self.show_timings or self.timings_log:
+            self.timings = Timings(query)
+            if self.dictionary is not None:
+                self.dictionary.timings = self.timings
+        if self.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        return None
+
+    def end_query(self, profiler):
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(self.profile)
+            print(f'Wrote profile to {self.profile}', file=sys.stderr)
+            self.profile = None
+        if self.timings is None:
+            return
+        if self.show_timings:
+            self.timings.print(sys.stderr)
+        if self.timings_log:
+            line = json.dumps(self.timings.record(), ensure_ascii=False)
+            if self.timings_log == '-':
+                print(line, file=sys.stderr)
+            else:
+                with open(self.timings_log, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+        self.timings = None
+        if self.dictionary is not None:
+            self.dictionary.timings = None
+
+    # Headwords close to a query that found nothing
+    def suggest(self, query):
+        if self.client is not None:
+            return self.client.request({'op': 'suggest',
+                'query': query})['suggestions']
+        return self.dictionary.suggest(query)
+
+    # Returns True if single entry selected from multiple results
+    def parse_results(self, results, query):
+        entry_indexes = self.get_entry_indexes(results, query)
+        if entry_indexes == -1:
+            return False
+        # Look in ky.t
+        if entry_indexes is None:
+            results = timed(self.timings, 'search', self.find_results,
+                query, True)
+            entry_indexes = self.get_entry_indexes(results, query)
+        if entry_indexes is None:
+            print(f'Search for {query} returned no results')
+            suggestions = [] if self.pattern else self.suggest(query)
+            if suggestions:
+                print(f'Did you mean: {", ".join(suggestions)}?')
+            print()
+            return False
+        # Non-wrapped text may have scrolling issues in print_only mode, so
+        # an explicit width is necessary.
+        width = self.width
+        if not self.print_only and not width:
+            import shutil
+            terminal_size = shutil.get_terminal_size((80, 50))
+            width = terminal_size.columns - 10
+        try:
+            text = self.get_text(entry_indexes, query, width)
+        except EntryNotFoundError as e:
+            logging.error(e)
+            return False
+        if not self.print_only:
+            import subprocess
+            process = subprocess.Popen(['less', '-r'], stdin=subprocess.PIPE)
+            try:
+                process.stdin.write(bytes(text, 'utf-8'))
+                process.communicate()
+            except IOError as e:
+                pass
+        else:
+            print(text)
+            return False
+        return len(results) > 1
+
+    # Find entries for a query in hw.t (or ky.t), or in the full text
+    def find_results(self, query, keys=False):
+        if self.pattern and not keys:
+            return self.find_pattern_results(query)
+        if self.client is not None:
+            response = self.client.request({'op': 'search', 'query': query,
+                'keys': keys, 'fulltext': self.fulltext, 'limit': self.limit})
+            return [Match(*result) for result in response['results']]
+        return self.dictionary.search(query, keys, self.fulltext,
+            limit=self.limit)
+
+    # Find headwords matching a pattern, reporting how many were verified.
+    # Batch output carries only the results, so the report is logged there.
+    def find_pattern_results(self, query):
+        try:
+            re.compile(pattern_regex(query))
+        except re.error as e:
+            if self.batch:
+                logging.error('Invalid pattern %s: %s' % (query, e))
+            else:
+                print(f'Invalid pattern {query}: {e}\n')
+            return []
+        if self.client is not None:
+            response = self.client.request({'op': 'search', 'query': query,
+                'pattern': True, 'limit': self.limit})
+            results = [Match(*result) for result in response['results']]
+            verified = response['verified']
+        else:
+            results, verified = self.dictionary.find_pattern(query, self.limit)
+        if self.batch:
+            logging.info('%d entries found, %d headwords verified'
+                % (len(results), verified))
+        else:
+            print(f'{len(results)} entries found, '
+                f'{verified} headwords verified\n')
+        return results
+
+    # Render the definitions of entries as text
+    def get_text(self, entry_indexes, query, width, color=True):
+        if self.client is not None:
+            response = timed(self.timings, 'daemon', self.client.request,
+                {'op': 'text', 'query': query, 'entries': entry_indexes,
+                'width': width, 'color': color})
+            return response['text']
+        return self.dictionary.text(entry_indexes, width, color)
+
+    # Serve lookups as JSON over HTTP on [host:]port:
+    #   GET /search?q=QUERY[&keys=1][&fulltext=1][&pattern=1][&limit=N]
+    #   GET /entry/ID[?format=rendered|plain|structured][&width=N]
+    #   GET /suggest?q=QUERY
+    # Connections are kept alive, and lookups run in a pool of jobs threads
+    # so that slow entries do not hold up the event loop.
+    def run_http(self, address, jobs):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        host, _, port = address.rpartition(':')
+        host = host or '127.0.0.1'
+        executor = ThreadPoolExecutor(jobs)
+        # Bound the lookups queued for the executor
+        slots = asyncio.Semaphore(4 * jobs)
+
+        async def handle(reader, writer):
+            await self.handle_http(reader, writer, executor, slots)
+
+        async def serve():
+            server = await asyncio.start_server(handle, host, int(port))
+            print(f'Serving HTTP on {host}:{port}. Use Ctrl-C to quit.')
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            print()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    async def handle_http(self, reader, writer, executor, slots):
+        import asyncio
+        from http import HTTPStatus
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length:
+                    await reader.readexactly(length)
+                try:
+                    method, target, version = \
+                        request_line.decode('latin-1').split()
+                except ValueError:
+                    self.write_http(writer, HTTPStatus.BAD_REQUEST,
+                        {'error': 'Malformed request line'}, False)
+                    break
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' or (
+                    version == 'HTTP/1.1' and connection != 'close')
+                start_time = time.monotonic()
+                if method != 'GET':
+                    status, body = HTTPStatus.METHOD_NOT_ALLOWED, {
+                        'error': f'{method} is not supported'}
+                else:
+                    async with slots:
+                        status, body = await loop.run_in_executor(executor,
+                            self.route_http, target)
+                logging.info('%s %s %d in %.1f ms' % (method, target, status,
+                    (time.monotonic() - start_time) * 1000))
+                self.write_http(writer, status, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def write_http(writer, status, body, keep_alive):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        writer.write((f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(data)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            '\r\n').encode('latin-1') + data)
+
+    # Return the status and JSON body for a request target
+    def route_http(self, target):
+        from http import HTTPStatus
+        from urllib.parse import parse_qs, urlsplit
+        url = urlsplit(target)
+        params = {name: values[-1]
+            for name, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        try:
+            if parts == ['search']:
+                return HTTPStatus.OK, self.http_search(params)
+            if parts == ['suggest']:
+                if not params.get('q'):
+                    raise HttpError(HTTPStatus.BAD_REQUEST,
+                        'Missing parameter q')
+                return HTTPStatus.OK, {'query': params['q'],
+                    'suggestions': self.suggest(params['q'])}
+            if len(parts) == 2 and parts[0] == 'entry':
+                return HTTPStatus.OK, self.http_entry(parts[1], params)
+            raise HttpError(HTTPStatus.NOT_FOUND, f'No such path {url.path}')
+        except HttpError as e:
+            return e.status, {'error': str(e)}
+        except EntryNotFoundError as e:
+            return HTTPStatus.NOT_FOUND, {'error': str(e)}
+        except FileNotFoundError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}
+        except Exception as e:
+            logging.exception('Request %s failed' % target)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+    def http_search(self, params):
+        from http import HTTPStatus
+        query = params.get('q')
+        if not query:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Missing parameter q')
+        response = {'query': query}
+        limit = self.http_int(params, 'limit', self.limit)
+        if params.get('keys') == '1':
+            results = self.dictionary.search(query, keys=True)
+        elif params.get('fulltext') == '1':
+            results = self.dictionary.search(query, fulltext=True,
+                limit=limit)
+        elif params.get('pattern') == '1':
+            try:
+                results, response['verified'] = \
+                    self.dictionary.find_pattern(query, limit)
+            except re.error as e:
+                raise HttpError(HTTPStatus.BAD_REQUEST,
+                    f'Bad pattern {query}: {e}')
+        else:
+            results = self.dictionary.search(query)
+        response['results'] = [{'id': entry_index, 'headword': headword}
+            for entry_index, headword in results[:limit]]
+        return response
+
+    def http_entry(self, entry_id, params):
+        from http import HTTPStatus
+        if not entry_id.isdigit():
+            raise HttpError(HTTPStatus.BAD_REQUEST, f'Bad entry id {entry_id}')
+        output_format = params.get('format', 'rendered')
+        width = self.http_int(params, 'width', None)
+        entry = self.dictionary.entry(int(entry_id))
+        response = {'id': entry.id, 'headword': entry.headword}
+        if output_format in ('rendered', 'plain'):
+            response['text'] = self.dictionary.render(entry, width,
+                output_format == 'rendered')
+        elif output_format == 'structured':
+            response['body'] = self.dictionary.structure(entry)
+        else:
+            raise HttpError(HTTPStatus.BAD_REQUEST,
+                f'Unknown format {output_format}')
+        return response
+
+    @staticmethod
+    def http_int(params, name, default):
+        from http import HTTPStatus
+        value = params.get(name)
+        if value is None:
+            return default
+        if not value.isdigit():
+            raise HttpError(HTTPStatus.BAD_REQUEST, f'Bad {name} {value}')
+        return int(value)
+
+    # Keep the files open and answer lookups from other oed.py processes
+    def run_server(self, socket_path):
+        if DaemonClient.connect(socket_path) is not None:
+            logging.error('A daemon is already listening on %s' % socket_path)
+            exit(1)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        umask = os.umask(0o077)
+        DaemonHandler, DaemonServer = daemon_classes()
+        try:
+            server = DaemonServer(socket_path, DaemonHandler)
+        finally:
+            os.umask(umask)
+        server.oed_search = self
+        # Clean up the socket when stopped with kill as well
+        import signal
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f'Serving lookups on {socket_path}. Use Ctrl-C to quit.')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print()
+        finally:
+            server.server_close()
+            os.unlink(socket_path)
+
+    # Answer a request from DaemonClient
+    def handle_request(self, request):
+        op = request.get('op')
+        if op == 'search':
+            if request.get('pattern'):
+                results, verified = self.dictionary.find_pattern(
+                    request['query'], request.get('limit'))
+                return {'results': results, 'verified': verified}
+            return {'results': self.dictionary.search(request['query'],
+                request.get('keys', False), request.get('fulltext', False),
+                limit=request.get('limit'))}
+        if op == 'text':
+            return {'text': self.dictionary.text(request['entries'],
+                request.get('width'), request.get('color', True))}
+        if op == 'suggest':
+            return {'suggestions': self.dictionary.suggest(request['query'])}
+        raise ValueError(f'Unknown request {op!r}')
+
+    # Look up every query in a file ('-' for stdin). All queries are resolved
+    # first so that each block is decompressed once for all entries in it,
+    # then the results are printed in input order.
+    def run_batch(self, filename, output_format):
+        if filename == '-':
+            lines = list(sys.stdin)
+        else:
+            with open(filename, encoding='utf-8') as f:
+                lines = list(f)
+        queries = [line.strip() for line in lines if line.strip()]
+        resolved = [self.resolve_query(query) for query in queries]
+        entries = self.dictionary.entries(match.id
+            for results in resolved for match in results)
+        for query, results in zip(queries, resolved):
+            results = [match for match in results if match.id in entries]
+            if output_format == 'jsonl':
+                print(json.dumps({'query': query, 'found': bool(results),
+                    'entries': [{'id': entry_index, 'headword': headword,
+                        'text': self.dictionary.render(entries[entry_index],
+                            color=False)}
+                        for entry_index, headword in results]},
+                    ensure_ascii=False))
+            elif results:
+                markup = ''.join(entries[match.id].markup
+                    for match in results)
+                print(self.dictionary.render(markup, self.width))
+            else:
+                print(f'Search for {query} returned no results\n')
+
+    # Find all entries for a query, first in hw.t and then in ky.t
+    def resolve_query(self, query):
+        results = self.find_results(query)
+        if not results and not self.fulltext:
+            results = self.find_results(query, keys=True)
+        return results
+
+    # Write every entry of oed.t from start_block on, in entry order. Blocks
+    # are rendered by a pool of processes but written one at a time, with at
+    # most a few blocks per process held in memory.
+    def run_export(self, filename, output_format, start_block, jobs):
+        checkpoint = None
+        if filename == '-':
+            out = sys.stdout
+        else:
+            # Append when resuming an interrupted export
+            checkpoint = filename + '.resume'
+            out = open(filename, 'a' if start_block else 'w', encoding='utf-8')
+        blk_indexes = range(start_block, len(tables().oedlen) - 1)
+        start_time = time.monotonic()
+        try:
+            if checkpoint is not None and start_block:
+                self.resume_export(out, checkpoint, start_block)
+            blocks = map_blocks(export_block, blk_indexes, jobs,
+                init_export_worker, (self.dictionary.oed_path, self.width))
+            self.write_export(out, output_format, blocks, start_time,
+                checkpoint)
+            if checkpoint is not None and os.path.exists(checkpoint):
+                os.unlink(checkpoint)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    # Cut the output back to the end of the last block written in full
+    # before the export was interrupted, as recorded in the checkpoint
+    def resume_export(self, out, checkpoint, start_block):
+        try:
+            with open(checkpoint, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning('Cannot read checkpoint %s, appending to the '
+                'output as it is: %s' % (checkpoint, e))
+            return
+        if state['next_block'] != start_block:
+            logging.error('The export stopped before block %d, resume it '
+                'with --start-block %d' % (state['next_block'],
+                state['next_block']))
+            exit(1)
+        logging.info('Resuming at block %d, offset %d' % (start_block,
+            state['offset']))
+        out.truncate(state['offset'])
+
+    # Scan the text of every entry for a regular expression without an index.
+    # Blocks are decompressed by a pool of threads (zlib releases the GIL) and
+    # hits are printed in block order as soon as they are found, stopping all
+    # remaining work once --limit entries have matched.
+    def run_grep(self, pattern, output_format, jobs):
+        from concurrent.futures import ThreadPoolExecutor
+        try:
+            regex = re.compile(pattern)
+        except re.error as e:
+            logging.error('Invalid pattern %s: %s' % (pattern, e))
+            exit(1)
+        count = 0
+        blocks_done = 0
+        start_time = time.monotonic()
+        grep = partial(self.grep_block, regex)
+        with ThreadPoolExecutor(jobs) as executor:
+            blocks = submit_window(executor, grep,
+                range(len(tables().oedlen) - 1), 2 * jobs)
+            try:
+                for blk_index, hits in blocks:
+                    blocks_done += 1
+                    for entry_index, text, match in hits:
+                        self.print_grep_hit(output_format, entry_index,
+                            blk_index, text, match)
+                        count += 1
+                        if count >= self.limit:
+                            break
+                    if count >= self.limit:
+                        break
+            finally:
+                blocks.close()
+        elapsed = time.monotonic() - start_time
+        logging.info('Scanned %d blocks in %.2fs (%.1f blocks/s), %d hits' % (
+            blocks_done, elapsed, blocks_done / elapsed if elapsed else 0,
+            count))
+
+    # Return (entry index, text, match) for the first match in each entry
+    def grep_block(self, regex, blk_index):
+        hits = []
+        for entry_index, data in self.dictionary.read_block(blk_index):
+            text = plain_text(data)
+            match = regex.search(text)
+            if match:
+                hits.append((entry_index, text, match))
+        return blk_index, hits
+
+    def print_grep_hit(self, output_format, entry_index, blk_index, text,
+            match):
+        headword = self.dictionary.headword(entry_index)
+        context = ' '.join(text[max(match.start() - 40, 0):
+            match.end() + 40].split())
+        if output_format == 'jsonl':
+            print(json.dumps({'id': entry_index, 'block': blk_index,
+                'headword': headword, 'match': match.group(),
+                'context': context}, ensure_ascii=False))
+        else:
+            print(f'{entry_index}\t{headword}\t{context}')
+
+    def write_export(self, out, output_format, blocks, start_time,
+            checkpoint=None):
+        for count, (blk_index, entries) in enumerate(blocks, 1):
+            for entry_index, text in entries:
+                if output_format == 'jsonl':
+                    out.write(json.dumps({'id': entry_index,
+                        'block': blk_index,
+                        'headword': self.dictionary.headword(entry_index),
+                        'text': text}, ensure_ascii=False) + '\n')
+                else:
+                    out.write(text)
+            out.flush()
+            # Resume with --start-block <blk_index + 1> if interrupted
+            if checkpoint is not None:
+                write_atomic(checkpoint, json.dumps({
+                    'next_block': blk_index + 1,
+                    'offset': out.tell()}).encode('utf-8'))
+            logging.info('Exported block %d (%.1f blocks/s)' % (blk_index,
+                count / (time.monotonic() - start_time)))
+
+    # Get query from arguments
+    def get_query(self):
+        # Line editing for input()
+        import readline
+        try:
+            query = input('Enter search term: ')
+        except:
+            print('\n')
+            exit(1)
+        print()
+        return query
+
+    def get_selected_entries(self, entries):
+        import readline
+        try:
+            selected = input('Please select an entry (none for all): ')
+        except KeyboardInterrupt:
+            print('\n')
+            exit(1)
+        except EOFError:
+            print('\n')
+            return -1
+        if not selected:
+            # Select all entries
+            print()
+            return [(index) for index, query in entries]
+        if not selected.isnumeric():
+            print(f'\'{selected}\' is not a number\n')
+            return None
+        index = int(selected)
+        if index > len(entries) or index < 1:
+            print(f'\'{index}\' is out of range\n')
+            return None
+        # Select single entry
+        print()
+        return [entries[index - 1][0]]
+
+    def get_entry_indexes(self, results, query):
+        text = ''
+        entry_indexes = None
+        if len(results) > 1:
+            for i in range(0, len(results)):
+                result = results[i]
+                text += f'{i+1:d}. {result[1]}\n'
+            print(render_markup(text))
+            while entry_indexes is None:
+                entry_indexes = self.get_selected_entries(results)
+        elif len(results) > 0:
+            entry_indexes = [results[0][0]]
+        if entry_indexes is None:
+            logging.info('Selected entry is invalid')
+        elif entry_indexes == -1:
+            logging.info('Return to query search')
+        elif len(entry_indexes) == 1:
+            logging.info('%s is entry number %d' % (query, entry_indexes[0]))
+        elif len(entry_indexes) > 1:
+            logging.info('Selected multiple entries')
+        return entry_indexes
+
+    # Default socket of the daemon for a dictionary directory
+    @staticmethod
+    def get_socket_path(directory):
+        realdir = os.path.realpath(directory)
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+        if not runtime_dir:
+            import tempfile
+            runtime_dir = tempfile.gettempdir()
+        return os.path.join(runtime_dir, 'oed-%d-%08x.sock' % (os.getuid(),
+            zlib.crc32(realdir.encode())))
+
+# Per-process state of pool workers
+worker = {}
+
+def init_export_worker(oed_path, width):
+    worker['reader'] = BlockReader(oed_path)
+    worker['width'] = width
+
+# Render all entries of a block as plain text
+def export_block(blk_index):
+    reader = worker['reader']
+    width = worker['width']
+    blk = Dictionary.decompress_block(reader, tables().oedlen, blk_index, True)
+    first = tables().oednum[blk_index]
+    num_entries = tables().oednum[blk_index + 1] - first
+    entries = []
+    for i, (start, end) in enumerate(
+            islice(entry_spans(blk), num_entries)):
+        definition = decode_entities(decode_text(memoryview(blk)[start:end]))
+        entries.append((first + i,
+            Dictionary.render(definition, width, False)))
+    return blk_index, entries
+
+def init_repack_worker(oed_path, zdict):
+    worker['reader'] = BlockReader(oed_path)
+    worker['zdict'] = zdict
+
+# Compress the entries of a block in groups of about PackedCorpus.GROUP_BYTES.
+# Returns the compressed groups and (entry index, offset, length) of the
+# entries in each.
+def repack_block(blk_index):
+    blk = Dictionary.decompress_block(worker['reader'], tables().oedlen,
+        blk_index, True)
+    first = tables().oednum[blk_index]
+    num_entries = tables().oednum[blk_index + 1] - first
+    groups = []
+    members = []
+    chunks = []
+    size = 0
+    spans = list(islice(entry_spans(blk), num_entries))
+    for i, (start, end) in enumerate(spans):
+        members.append((first + i, size, end - start))
+        chunks.append(blk[start:end])
+        size += end - start
+        if size >= PackedCorpus.GROUP_BYTES or i == len(spans) - 1:
+            compressor = zlib.compressobj(9, zdict=worker['zdict'])
+            comp_data = compressor.compress(b''.join(chunks))
+            groups.append((comp_data + compressor.flush(), members))
+            members = []
+            chunks = []
+            size = 0
+    return blk_index, groups
+
+# Apply func to each block index in a pool of processes (or in this process
+# if jobs is 1), yielding the results in order
+def map_blocks(func, blk_indexes, jobs, initializer, initargs):
+    if jobs == 1:
+        initializer(*initargs)
+        yield from map(func, blk_indexes)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(jobs, initializer=initializer,
+            initargs=initargs) as executor:
+        yield from submit_window(executor, func, blk_indexes, 2 * jobs)
+
+# Like executor.map, but keep at most window tasks in flight so results are
+# not piling up in memory ahead of the consumer. Tasks not yet started are
+# cancelled when the consumer closes the generator early.
+def submit_window(executor, func, iterable, window):
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Search for a word in the Oxford English Dictionary')
+    parser.add_argument('--dir', default=script_directory(), help='directory of hw.t, ky.t and oed.t (default: the directory of oed.py)')
+    parser.add_argument('-p',  '--print', action='store_true', help='print definition(s) then exit')
+    parser.add_argument('-w', '--width', type=int, help='wrap to column width (default: 80)')
+    parser.add_argument('-d', '--debug', action='store_true', help='debug mode')
+    parser.add_argument('--timings', action='store_true', help='print the time, calls, bytes and peak memory of each stage of a lookup to stderr')
+    parser.add_argument('--timings-log', metavar='FILE', help='append the timings of each lookup to FILE (- for stderr) as a JSON line')
+    parser.add_argument('--profile', metavar='FILE', help='write cProfile stats of the first lookup to FILE')
+    parser.add_argument('--render-cache-mb', type=float, default=64, help='disk space for rendered entries in $XDG_CACHE_HOME/oed in MB, 0 to disable (default: 64)')
+    parser.add_argument('--block-cache-mb', type=float, default=64, help='memory for decompressed blocks in MB (default: 64)')
+    parser.add_argument('-b', '--batch', metavar='FILE', help='look up each line of FILE (- for stdin), then exit')
+    parser.add_argument('-f', '--format', choices=['text', 'jsonl'], default='text', help='output format of --batch, --export and --grep (default: text)')
+    parser.add_argument('-e', '--export', metavar='FILE', help='write all entries as plain text to FILE (- for stdout), then exit')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='processes used by --export and --build-fulltext, threads used by --grep (default: number of CPUs)')
+    parser.add_argument('--start-block', type=int, default=0, help='resume --export from this block, appending to FILE')
+    parser.add_argument('--build-catalog', action='store_true', help='index the entries of oed.t for faster lookups, then exit')
+    parser.add_argument('-t', '--fulltext', action='store_true', help='search the text of all entries for the words and "quoted phrases" in the query')
+    parser.add_argument('-x', '--pattern', action='store_true', help='match headwords against the query as a wildcard pattern with * and ?, or as a /regular expression/')
+    parser.add_argument('-g', '--grep', metavar='PATTERN', help='print entries whose text matches the regular expression PATTERN, then exit')
+    parser.add_argument('-l', '--limit', type=int, default=50, help='maximum number of full-text, --pattern or --grep results, and of --http searches (default: 50)')
+    parser.add_argument('--serve', action='store_true', help='keep the dictionary open and answer lookups from other oed.py processes over a Unix socket')
+    parser.add_argument('--http', metavar='[HOST:]PORT', help='serve lookups as JSON over HTTP (default host: 127.0.0.1), using --jobs threads')
+    parser.add_argument('--socket', metavar='PATH', help='socket of the daemon (default: in $XDG_RUNTIME_DIR)')
+    parser.add_argument('--no-daemon', action='store_true', help='do not forward lookups to a running daemon')
+    parser.add_argument('--repack', action='store_true', help='write a copy of oed.t with entries compressed in small groups for faster lookups, then exit')
+    parser.add_argument('--build-fulltext', action='store_true', help='build the full-text index of oed.t using --jobs processes, then exit')
+    parser.add_argument('query', metavar='query', nargs='?', default=None, help='word to search for')
+    args = parser.parse_args()
+    if args.build_catalog:
+        logging.basicConfig(level=logging.INFO)
+        EntryCatalog.create(os.path.join(args.dir, 'oed.t'))
+        return
+    if args.repack:
+        logging.basicConfig(level=logging.INFO)
+        PackedCorpus.create(os.path.join(args.dir, 'oed.t'), args.jobs)
+        return
+    if args.build_fulltext:
+        logging.basicConfig(level=logging.INFO)
+        FulltextIndex.create(os.path.join(args.dir, 'oed.t'), args.jobs)
+        return
+    oed_search = OedSearch(args)
@@ -0,0 +1,201 @@
+# Tests of the indexes and renderers of oedlib against the straightforward
+# versions they replaced, on a small dictionary written by fixture.py. Run
+# them with python3 -m pytest.
+
+import os
+import random
+import re
+import subprocess
+import sys
+
+import pytest
+
+import oedlib
+from bench import fold_per_char
+
+script_directory = os.path.dirname(os.path.realpath(__file__))
+
+# A dictionary of 2000 entries in 16 blocks. Its oeda.py is put first on
+# sys.path so that the tables of oedlib are those of the fixture, and the
+# user's cache directory is left alone.
+@pytest.fixture(scope='session')
+def directory(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('oed'))
+    subprocess.run([sys.executable, os.path.join(script_directory,
+        'fixture.py'), directory, '--entries', '2000', '--blocks', '16'],
+        check=True, stdout=subprocess.DEVNULL)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(directory, 'cache'))
+        monkeypatch.syspath_prepend(directory)
+        monkeypatch.delitem(sys.modules, 'oeda', raising=False)
+        oedlib.tables.cache_clear()
+        yield directory
+    oedlib.tables.cache_clear()
+
+@pytest.fixture(scope='session')
+def dictionary(directory):
+    with oedlib.Dictionary(directory, render_cache_mb=0) as dictionary:
+        yield dictionary
+
+@pytest.fixture(scope='session')
+def entries(dictionary):
+    return list(dictionary.iter_entries())
+
+# Queries for the prefix lookup: whole keys, their first words and some of
+# their prefixes, in other cases, and strings that match nothing
+def lookup_queries(keys):
+    rng = random.Random(0)
+    queries = {'bacon', 'BACON', 'cafe', 'café', 'aesir', 'Æsir', 'set',
+        'zzz', '', 'ba', 'bacon bit', 'bacon-'}
+    for key in rng.sample(keys, 100):
+        queries.update([key, key.upper(), key.casefold(), key[:1], key[:2],
+            key[:len(key) // 2], re.split(r'[ -]', key)[0]])
+    return sorted(queries)
+
+# The lookup as find_entries did it with re.match(rf'^{query}\b'), here with
+# the query escaped as lookup takes it literally. Matches of the folded query
+# on the folded keys follow the exact ones.
+def lookup_by_regex(keys, folded_keys, query):
+    exact = [i for i, key in enumerate(keys)
+        if re.match(rf'^{re.escape(query)}\b', key)]
+    folded_query = rf'^{re.escape(oedlib.fold_key(query))}\b'
+    folded = [i for i, key in enumerate(folded_keys)
+        if re.match(folded_query, key)]
+    return exact + sorted(set(folded).difference(exact))
+
+@pytest.mark.parametrize('list_name', ['headwords', 'keys'])
+def test_lookup_matches_regex(dictionary, list_name):
+    index = dictionary.headwords if list_name == 'headwords' \
+        else dictionary.get_keys()
+    keys = [index.key(i) for i in range(len(index))]
+    folded_keys = list(map(oedlib.fold_key, keys))
+    for query in lookup_queries(keys):
+        assert [i for i, _ in index.lookup(query)] \
+            == lookup_by_regex(keys, folded_keys, query), query
+
+# Markup that render_markup must treat as HTMLParser does, including some it
+# leaves to MyHTMLParser
+markup_cases = ['', 'plain', '<e><hw>bacon</hw> <d>n.</d></e>',
+    '<E><HW>upper</HW></E>', 'a<br>b<br/>c<br />d', '<x a="1>2">text</x>',
+    "<x a='<b>'>text</x>", 'a<!-- <hw>comment</hw> -->b', 'a &amp; b &lt; c',
+    '&eacute;&#233;&#xe9;&unknown;', '1 < 2', 'a <3 b', '<', 'a<', '</>',
+    '<e>unclosed', '</hw>stray end', '<sube><xr>x</xr></sube><upd>u</upd>']
+
+@pytest.mark.parametrize('color', [True, False])
+def test_render_markup_matches_parser(entries, color):
+    MyHTMLParser, _ = oedlib.html_parsers()
+    for markup in markup_cases + [entry.markup for entry in entries]:
+        parser = MyHTMLParser(color)
+        parser.feed(markup)
+        parser.close()
+        assert oedlib.render_markup(markup, color) == parser.text, markup
+
+# Tokens of every entry, as the full-text index is built from them
+def tokenize_entries(dictionary):
+    tokens = {}
+    for blk_index in range(len(oedlib.tables().oedlen) - 1):
+        for entry_index, data in dictionary.read_block(blk_index):
+            tokens[entry_index] = oedlib.tokenize(oedlib.plain_text(data))
+    return tokens
+
+# Search by scanning the tokens of every entry for each phrase, skipping the
+# entries that lack one of its words
+def search_by_scan(tokens, query):
+    clauses = [oedlib.tokenize(phrase or word)
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query)]
+    clauses = [clause for clause in clauses if clause]
+    if not clauses:
+        return []
+    results = []
+    for entry_index, words in tokens.items():
+        hits = 0
+        vocabulary = set(words)
+        for clause in clauses:
+            if not vocabulary.issuperset(clause):
+                break
+            count = sum(1 for i in range(len(words) - len(clause) + 1)
+                if words[i:i + len(clause)] == clause)
+            if not count:
+                break
+            hits += count
+        else:
+            results.append((entry_index, hits))
+    return sorted(results, key=lambda item: (-item[1], item[0]))
+
+def test_fulltext_search_matches_scan(directory, dictionary):
+    oedlib.FulltextIndex.create(os.path.join(directory, 'oed.t'), 1)
+    index = dictionary.get_fulltext_index()
+    tokens = tokenize_entries(dictionary)
+    rng = random.Random(0)
+    queries = ['ba', 'BA Con', 'set run', '"ba con"', 'zzzz', '"ba zzzz"',
+        '...', '""', 'ba "con set" un']
+    for entry_index in rng.sample(sorted(tokens), 20):
+        words = tokens[entry_index]
+        i = rng.randrange(max(1, len(words) - 3))
+        queries.append(' '.join(words[i:i + 2]))
+        queries.append('"%s"' % ' '.join(words[i:i + 3]))
+    for query in queries:
+        assert index.search(query) == search_by_scan(tokens, query), query
+
+# Wildcard patterns and regular expressions as given to --pattern
+def pattern_queries(terms):
+    rng = random.Random(0)
+    queries = ['*', '*ology', 'ba*', '*con*', 'un?ble', '?', '???', '*æ*',
+        '/^(after|fore)most$/', '/(?i)BACON/', '/caf./', r'/ba\w+con/',
+        '/x{2}/', '/a|b/', '/^$/', r'/\bset\b/', '/[aeiou]{3}/', '/-/']
+    for term in rng.sample(terms, 50):
+        i = rng.randrange(len(term))
+        queries.append('*%s*' % term[i:i + 4])
+        queries.append('%s*' % term[:3])
+        queries.append('/%s/' % re.escape(term[i:i + 3]))
+    return queries
+
+def test_trigram_match_matches_scan(dictionary):
+    index = dictionary.get_trigram_index()
+    terms = [index.term(i) for i in range(len(index))]
+    headwords = dictionary.headwords
+    assert sorted(terms) == sorted(set(headwords.key(i)
+        for i in range(len(headwords))))
+    for query in pattern_queries(terms):
+        pattern = oedlib.pattern_regex(query)
+        regex = re.compile(pattern)
+        matches, _ = index.match(regex.search,
+            oedlib.required_literals(pattern))
+        assert sorted(matches) \
+            == sorted(term for term in terms if regex.search(term)), query
+
+def test_repack_and_catalog_match_entries(directory, entries):
+    oed_path = os.path.join(directory, 'oed.t')
+    oedlib.PackedCorpus.create(oed_path, 1)
+    oedlib.EntryCatalog.create(oed_path)
+    corpus = oedlib.PackedCorpus.load(oed_path)
+    catalog = oedlib.EntryCatalog.load(oed_path)
+    assert corpus.count == catalog.count == len(entries)
+    with oedlib.Dictionary(directory, render_cache_mb=0) as dictionary:
+        assert dictionary.corpus is not None
+        blocks = {}
+        for entry in entries:
+            assert dictionary.get_definition(corpus.entry(entry.id)) \
+                == entry.markup
+            blk_index, offset, length = catalog.locate(entry.id)
+            assert blk_index == entry.block
+            if blk_index not in blocks:
+                blocks[blk_index] = oedlib.Dictionary.decompress_block(
+                    dictionary.oed, oedlib.tables().oedlen, blk_index, True)
+            data = memoryview(blocks[blk_index])[offset:offset + length]
+            assert dictionary.get_definition(data) == entry.markup
+            assert dictionary.entry(entry.id) == entry
+
+# Lines with runs of spaces, words longer than the width and color codes
+fold_cases = ['', ' ', 'a', 'a b', '   lead', 'trail   ', 'a    b  c',
+    'word ' * 30, 'x' * 100 + ' y', '\n\n', 'one\ntwo three\n',
+    '\x1b[92m\x1b[1mbacon\x1b[0m n. ' * 20, '\x1b[94m' + 'z' * 90]
+
+@pytest.mark.parametrize('width', [1, 10, 40, 80, 200])
+def test_fold_matches_per_char(entries, width):
+    texts = fold_cases + [oedlib.render_markup(entry.markup, color).encode(
+        'ascii', 'replace').decode() for entry in entries[::20]
+        for color in (True, False)]
+    for text in texts:
+        assert oedlib.Dictionary.fold(text, width) \
+            == fold_per_char(text, width), text